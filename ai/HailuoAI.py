@@ -1,8 +1,11 @@
-﻿import http.client
-import json
-import time
+﻿import requests
 import random
+from concurrent.futures import Future
+from utils import http
+from utils.rate_limit import SUBMIT, POLL
 from utils.logger import setup_logger
+from services.webhook_server import callback_url, webhook_secret, is_enabled as webhooks_enabled
+from services.poller import PollResult, PENDING, COMPLETED, FAILED, track
 from dotenv import load_dotenv
 import os
 
@@ -10,55 +13,46 @@ load_dotenv()
 logger = setup_logger("HailuoAI")
 
 
+API_URL = "https://api.piapi.ai"
 API_KEY = os.getenv("PIAPI_API_KEY")
+QUOTA_KEY = "piapi"  # бюджет запросов общий для всех движков на этом ключе
 
-def generate_video_with_hailuo(prompt: str) -> str:
-    """
-    Генерирует видео через API Hailuo.
-
-    Args:
-        prompt (str): Текстовый промпт для генерации видео.
+REQUEST_TIMEOUT = 10
+MAX_WAIT_TIME = 600  # 10 minutes
+MODEL_TYPE = "t2v-01-director"
 
-    Returns:
-        str: URL сгенерированного видео.
+HEADERS = {
+    'x-api-key': API_KEY,
+    'Content-Type': 'application/json'
+}
 
-    Raises:
-        Exception: При ошибках работы с API или отсутствии необходимых данных.
-    """
-
-    model_type = "t2v-01-director"
+def submit_hailuo_task(prompt: str) -> str:
+    """Отправляет задачу генерации в Hailuo и возвращает её task_id."""
     expand_prompt = random.choice([True, False])  # Рандомизация расширения промпта
 
-    payload = json.dumps({
+    payload = {
         "model": "hailuo",
         "task_type": "video_generation",
         "input": {
             "prompt": prompt,
-            "model": model_type,
+            "model": MODEL_TYPE,
             "expand_prompt": expand_prompt
         },
         "config": {
             "service_mode": "public",
             "webhook_config": {
-                "endpoint": "",
-                "secret": ""
+                "endpoint": callback_url("hailuo"),
+                "secret": webhook_secret()
             }
         }
-    })
-
-    headers = {
-        'x-api-key': API_KEY,
-        'Content-Type': 'application/json'
     }
 
     try:
         # --- Отправка POST-запроса на создание задачи ---
-        conn = http.client.HTTPSConnection("api.piapi.ai", timeout=10)
-        conn.request("POST", "/api/v1/task", payload, headers)
-        res = conn.getresponse()
-        raw_data = res.read().decode("utf-8")
-        data = json.loads(raw_data)
-        conn.close()
+        response = http.post(
+            f"{API_URL}/api/v1/task", quota=(QUOTA_KEY, SUBMIT), headers=HEADERS, json=payload, timeout=REQUEST_TIMEOUT
+        )
+        data = response.json()
 
         logger.info(f"Task creation response: {data}")
 
@@ -66,41 +60,66 @@ def generate_video_with_hailuo(prompt: str) -> str:
         if not task_id:
             raise Exception("Failed to obtain task_id from response")
 
-        # --- Опрос статуса задачи с интервалом 30 секунд ---
-        while True:
-            time.sleep(30)
-            conn = http.client.HTTPSConnection("api.piapi.ai", timeout=10)
-            conn.request("GET", f"/api/v1/task/{task_id}", headers=headers)
-            res = conn.getresponse()
-            raw_status = res.read().decode("utf-8")
-            status_data = json.loads(raw_status)
-            conn.close()
-
-            status = status_data.get("data", {}).get("status")
-            logger.info(f"Task status: {status}")
-
-            if status == "completed":
-                video_url = status_data.get("data", {}).get("output", {}).get("download_url")
-                if not video_url:
-                    raise Exception("Task completed but download_url is missing")
-                logger.info(f"Video generation completed successfully, URL: {video_url}")
-                return video_url
-
-            elif status == "failed":
-                raise Exception("Task failed during video generation")
-
-            # Можно логировать остальные статусы, например: pending, running, etc.
-            else:
-                logger.info(f"Waiting for task completion, current status: {status}")
-
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         logger.error(f"JSON decoding error: {e}")
         raise
 
-    except http.client.HTTPException as e:
+    except requests.RequestException as e:
         logger.error(f"HTTP error during request: {e}")
         raise
 
+    return task_id
+
+
+def check_hailuo_task(task_id: str) -> PollResult:
+    """Один опрос статуса задачи Hailuo."""
+    response = http.get(
+        f"{API_URL}/api/v1/task/{task_id}", quota=(QUOTA_KEY, POLL), headers=HEADERS, timeout=REQUEST_TIMEOUT
+    )
+    status_data = response.json()
+
+    status = status_data.get("data", {}).get("status")
+    logger.info(f"Task status: {status}")
+
+    if status == "completed":
+        video_url = status_data.get("data", {}).get("output", {}).get("download_url")
+        if not video_url:
+            return PollResult(FAILED, error="Task completed but download_url is missing")
+        logger.info(f"Video generation completed successfully, URL: {video_url}")
+        return PollResult(COMPLETED, video_url)
+
+    elif status == "failed":
+        return PollResult(FAILED, error="Task failed during video generation")
+
+    # Можно логировать остальные статусы, например: pending, running, etc.
+    logger.info(f"Waiting for task completion, current status: {status}")
+    return PollResult(PENDING)
+
+
+def start_video_with_hailuo(prompt: str) -> Future:
+    """Запускает генерацию и возвращает Future с URL видео."""
+    task_id = submit_hailuo_task(prompt)
+    return track(
+        "hailuo", task_id, check_hailuo_task,
+        max_wait=MAX_WAIT_TIME, callbacks=webhooks_enabled(), model=MODEL_TYPE
+    )
+
+
+def generate_video_with_hailuo(prompt: str) -> str:
+    """
+    Генерирует видео через API Hailuo.
+
+    Args:
+        prompt (str): Текстовый промпт для генерации видео.
+
+    Returns:
+        str: URL сгенерированного видео.
+
+    Raises:
+        Exception: При ошибках работы с API или отсутствии необходимых данных.
+    """
+    try:
+        return start_video_with_hailuo(prompt).result()
     except Exception as e:
         logger.exception(f"Unexpected error during video generation: {e}")
         raise
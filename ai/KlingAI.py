@@ -1,16 +1,21 @@
 ﻿import os
 import json
-import time
 import random
 import requests
+from concurrent.futures import Future
 from dotenv import load_dotenv
+from utils import http
+from utils.rate_limit import SUBMIT, POLL
 from utils.logger import setup_logger
+from services.webhook_server import callback_url, webhook_secret, is_enabled as webhooks_enabled
+from services.poller import PollResult, PENDING, COMPLETED, FAILED, track
 
 load_dotenv()
 logger = setup_logger("Kling")
 
 API_URL = "https://api.piapi.ai"
 API_KEY = os.getenv("PIAPI_API_KEY")
+QUOTA_KEY = "piapi"  # бюджет запросов общий для всех движков на этом ключе
 HEADERS = {
     'x-api-key': API_KEY,
     'Content-Type': 'application/json'
@@ -19,7 +24,7 @@ HEADERS = {
 MAX_WAIT_TIME = 600  # 10 minutes
 POLL_INTERVAL = 30
 
-def generate_video_with_kling(prompt: str) -> str:
+def submit_kling_task(prompt: str) -> str:
     cfg_scale = round(random.uniform(0, 1), 2)
     duration = 10
     aspect_ratio = "9:16"
@@ -55,14 +60,16 @@ def generate_video_with_kling(prompt: str) -> str:
         "config": {
             "service_mode": "",
             "webhook_config": {
-                "endpoint": "",
-                "secret": ""
+                "endpoint": callback_url("kling"),
+                "secret": webhook_secret()
             }
         }
     }
 
     try:
-        response = requests.post(f"{API_URL}/api/v1/task", headers=HEADERS, json=payload, timeout=60)
+        response = http.post(
+            f"{API_URL}/api/v1/task", quota=(QUOTA_KEY, SUBMIT), headers=HEADERS, json=payload, timeout=60
+        )
         response.raise_for_status()
         data = response.json()
         task_id = data.get("data", {}).get("task_id")
@@ -70,36 +77,47 @@ def generate_video_with_kling(prompt: str) -> str:
         if not task_id:
             raise Exception(f"task_id missing from response: {data}")
 
-        logger.info(f"Task created: {task_id}, polling for completion...")
+    except requests.RequestException as e:
+        logger.error(f"HTTP request failed: {e}")
+        raise
 
-        start_time = time.time()
-        while True:
-            elapsed = time.time() - start_time
-            if elapsed > MAX_WAIT_TIME:
-                raise TimeoutError("Video generation timed out after 10 minutes.")
+    logger.info(f"Task created: {task_id}, polling for completion...")
+    return task_id
 
-            time.sleep(POLL_INTERVAL)
-            status_resp = requests.get(f"{API_URL}/api/v1/task/{task_id}", headers=HEADERS, timeout=60)
-            status_resp.raise_for_status()
-            task_data = status_resp.json()
-            status = task_data.get("data", {}).get("status")
 
-            if status == "completed":
-                video_url = task_data.get("data", {}).get("output", {}).get("video_url")
-                if not video_url:
-                    raise Exception("Task completed but no video_url returned.")
-                logger.info(f"Video successfully generated: {video_url}")
-                return video_url
+def check_kling_task(task_id: str) -> PollResult:
+    status_resp = http.get(
+        f"{API_URL}/api/v1/task/{task_id}", quota=(QUOTA_KEY, POLL), headers=HEADERS, timeout=60
+    )
+    status_resp.raise_for_status()
+    task_data = status_resp.json()
+    status = task_data.get("data", {}).get("status")
 
-            elif status == "failed":
-                raise Exception("Video generation failed according to API status.")
+    if status == "completed":
+        video_url = task_data.get("data", {}).get("output", {}).get("video_url")
+        if not video_url:
+            return PollResult(FAILED, error="Task completed but no video_url returned.")
+        logger.info(f"Video successfully generated: {video_url}")
+        return PollResult(COMPLETED, video_url)
 
-            logger.info(f"Current status: {status}. Waiting...")
+    elif status == "failed":
+        return PollResult(FAILED, error="Video generation failed according to API status.")
 
-    except requests.RequestException as e:
-        logger.error(f"HTTP request failed: {e}")
-        raise
+    logger.info(f"Current status: {status}. Waiting...")
+    return PollResult(PENDING)
+
+
+def start_video_with_kling(prompt: str) -> Future:
+    task_id = submit_kling_task(prompt)
+    return track(
+        "kling", task_id, check_kling_task,
+        interval=POLL_INTERVAL, max_wait=MAX_WAIT_TIME, callbacks=webhooks_enabled()
+    )
 
+
+def generate_video_with_kling(prompt: str) -> str:
+    try:
+        return start_video_with_kling(prompt).result()
     except Exception as e:
         logger.exception(f"Unexpected error during Kling video generation: {e}")
         raise
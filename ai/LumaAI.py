@@ -1,18 +1,22 @@
 ﻿import os
-import time
 import requests
 import random
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
 from dotenv import load_dotenv
-from openai import OpenAI
 import lumaai
 from lumaai import LumaAI
+from utils import http, llm
+from utils import rate_limit
+from utils.rate_limit import SUBMIT, POLL
 from utils.logger import setup_logger
+from services.poller import PollResult, PENDING, COMPLETED, FAILED, track, then
 
 load_dotenv()
 logger = setup_logger("LumaAI")
 
 API_TOKEN = os.getenv("LUMAAI_API_KEY")
+QUOTA_KEY = "luma"  # бюджет запросов общий для всех движков на этом ключе
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 
 if not API_TOKEN:
@@ -21,10 +25,16 @@ if not OPENAI_KEY:
     raise ValueError("Missing OPENAI_API_KEY environment variable")
 
 client = LumaAI(auth_token=API_TOKEN)
-openai_client = OpenAI(api_key=OPENAI_KEY)
 
 VIDEO_TIMEOUT = 600   # 10 minutes
 AUDIO_TIMEOUT = 300   # 5 minutes
+REQUEST_TIMEOUT = 30  # один HTTP-запрос к API звука
+AUDIO_PROMPT_TIMEOUT = 60
+AUDIO_PROMPT_CACHE_TTL = 24 * 60 * 60  # повторная попытка с тем же промптом не ходит в GPT
+MODEL = "ray-flash-2"
+
+# Описание звука готовится, пока рендерится видео, а не после него
+_audio_prompt_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="luma-audio-prompt")
 
 
 def generate_audio_prompt(video_prompt: str) -> str:
@@ -37,129 +47,173 @@ def generate_audio_prompt(video_prompt: str) -> str:
 
     user_prompt = f"Generate an audio prompt for this video: {video_prompt}"
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    audio_description = llm.complete(
+        "luma.audio_prompt",
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
-        ]
-    )
-
-    audio_description = response.choices[0].message.content.strip()
+        ],
+        timeout=AUDIO_PROMPT_TIMEOUT,
+        cache_ttl=AUDIO_PROMPT_CACHE_TTL
+    ).strip()
     logger.info(f"[audio_prompt] Generated audio prompt: {audio_description}")
     return audio_description
 
 
-def generate_video_with_luma(
+def submit_luma_video(
     prompt: str,
-    image_url: Optional[str] = None,
     aspect_ratio: Optional[str] = None
 ) -> str:
+    model = MODEL
+    resolution = "1080p"
+
+    logger.info("🚀 Sending video generation request to Luma...")
+    rate_limit.acquire(QUOTA_KEY, SUBMIT, timeout=rate_limit.SUBMIT_WAIT_TIMEOUT)
+    try:
+        generation = client.generations.create(
+            model=model,
+            aspect_ratio=aspect_ratio,
+            resolution=resolution,
+            duration="9s",
+            loop=False,
+            prompt=prompt,
+        )
+    except lumaai.APIConnectionError as e:
+        logger.error("LumaAI: Could not reach the server", exc_info=True)
+        raise
+    except lumaai.RateLimitError as e:
+        logger.error("LumaAI: Rate limit exceeded", exc_info=True)
+        rate_limit.throttle(QUOTA_KEY, rate_limit.retry_after_seconds(e.response.headers))
+        raise
+    except lumaai.APIStatusError as e:
+        logger.error(f"LumaAI: Non-200 status code: {e.status_code}", exc_info=True)
+        raise
+
+    return generation.id
+
+
+def check_luma_video(generation_id: str) -> PollResult:
+    rate_limit.acquire(QUOTA_KEY, POLL)
+    try:
+        generation = client.generations.get(id=generation_id)
+    except lumaai.RateLimitError as e:
+        rate_limit.throttle(QUOTA_KEY, rate_limit.retry_after_seconds(e.response.headers))
+        raise
+
+    if generation.state == "completed":
+        video_url = generation.assets.video
+        if not video_url:
+            return PollResult(FAILED, error="Video generation completed, but no video URL returned")
+        logger.info(f"✅ Video generated: {video_url}")
+        return PollResult(COMPLETED, video_url)
+
+    elif generation.state == "failed":
+        reason = generation.failure_reason or "Unknown error"
+        return PollResult(FAILED, error=f"LumaAI video generation failed: {reason}")
+
+    logger.info(f"Video status: {generation.state}... Waiting...")
+    return PollResult(PENDING)
+
+
+def _audio_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {API_TOKEN}",
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+
+
+def submit_luma_audio(generation_id: str, audio_prompt: str) -> str:
+    logger.info("🎵 Adding audio to video...")
+    audio_url = f"https://api.lumalabs.ai/dream-machine/v1/generations/{generation_id}/audio"
+
+    json_data = {
+        "generation_type": "add_audio",
+        "prompt": audio_prompt
+    }
+
     try:
-        model = "ray-flash-2"
-        resolution = "1080p"
+        response = http.post(
+            audio_url, quota=(QUOTA_KEY, SUBMIT), headers=_audio_headers(), json=json_data, timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        audio_generation = response.json()
+        return audio_generation["id"]
+    except requests.RequestException as e:
+        logger.error("Failed to start audio generation", exc_info=True)
+        raise
 
-        logger.info("🚀 Sending video generation request to Luma...")
+
+def check_luma_audio(audio_generation_id: str) -> PollResult:
+    status_resp = http.get(
+        f"https://api.lumalabs.ai/dream-machine/v1/generations/{audio_generation_id}",
+        quota=(QUOTA_KEY, POLL),
+        headers=_audio_headers(),
+        timeout=REQUEST_TIMEOUT
+    )
+    status_resp.raise_for_status()
+    status_data = status_resp.json()
+
+    state = status_data.get("state")
+    if state == "completed":
+        video_with_audio_url = status_data["assets"]["video"]
+        logger.info(f"✅ Video with audio is ready: {video_with_audio_url}")
+        return PollResult(COMPLETED, video_with_audio_url)
+    elif state == "failed":
+        reason = status_data.get("failure_reason", "Unknown error")
+        return PollResult(FAILED, error=f"Audio generation failed: {reason}")
+
+    logger.info(f"Audio status: {state}... Waiting...")
+    return PollResult(PENDING)
+
+
+def _track_video_with_audio(generation_id: str, prompt: str, first_delay: Optional[float] = None) -> Future:
+    logger.info(f"Polling video generation (ID: {generation_id})...")
+    audio_prompt_future = _audio_prompt_executor.submit(generate_audio_prompt, prompt)
+    video_future = track(
+        "luma", generation_id, check_luma_video,
+        max_wait=VIDEO_TIMEOUT, first_delay=first_delay,
+        resume_with=(resume_luma_video, (prompt,)),
+        model=MODEL
+    )
+
+    def _add_audio(video_url: str):
         try:
-            generation = client.generations.create(
-                model=model,
-                aspect_ratio=aspect_ratio,
-                resolution=resolution,
-                duration="9s",
-                loop=False,
-                prompt=prompt,
-            )
-        except lumaai.APIConnectionError as e:
-            logger.error("LumaAI: Could not reach the server", exc_info=True)
-            raise
-        except lumaai.RateLimitError as e:
-            logger.error("LumaAI: Rate limit exceeded", exc_info=True)
-            raise
-        except lumaai.APIStatusError as e:
-            logger.error(f"LumaAI: Non-200 status code: {e.status_code}", exc_info=True)
-            raise
-
-        logger.info(f"Polling video generation (ID: {generation.id})...")
-        start_time = time.time()
-
-        while True:
-            if time.time() - start_time > VIDEO_TIMEOUT:
-                raise TimeoutError("LumaAI video generation timed out after 10 minutes")
-
-            time.sleep(30)
-            generation = client.generations.get(id=generation.id)
-
-            if generation.state == "completed":
-                video_url = generation.assets.video
-                if not video_url:
-                    raise Exception("Video generation completed, but no video URL returned")
-                logger.info(f"✅ Video generated: {video_url}")
-                break
-
-            elif generation.state == "failed":
-                reason = generation.failure_reason or "Unknown error"
-                raise Exception(f"LumaAI video generation failed: {reason}")
-
-            logger.info(f"Video status: {generation.state}... Waiting...")
-
-        # Add audio
-        audio_prompt = generate_audio_prompt(prompt)
-        if audio_prompt:
-            logger.info("🎵 Adding audio to video...")
-            audio_url = f"https://api.lumalabs.ai/dream-machine/v1/generations/{generation.id}/audio"
-
-            headers = {
-                "Authorization": f"Bearer {API_TOKEN}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-
-            json_data = {
-                "generation_type": "add_audio",
-                "prompt": audio_prompt
-            }
-
-            try:
-                response = requests.post(audio_url, headers=headers, json=json_data)
-                response.raise_for_status()
-                audio_generation = response.json()
-                audio_generation_id = audio_generation["id"]
-            except requests.RequestException as e:
-                logger.error("Failed to start audio generation", exc_info=True)
-                raise
-
-            logger.info(f"Polling audio generation (ID: {audio_generation_id})...")
-            audio_start_time = time.time()
-
-            while True:
-                if time.time() - audio_start_time > AUDIO_TIMEOUT:
-                    raise TimeoutError("LumaAI audio generation timed out after 5 minutes")
-
-                time.sleep(30)
-                try:
-                    status_resp = requests.get(
-                        f"https://api.lumalabs.ai/dream-machine/v1/generations/{audio_generation_id}",
-                        headers=headers
-                    )
-                    status_resp.raise_for_status()
-                    status_data = status_resp.json()
-                except requests.RequestException as e:
-                    logger.warning("Polling audio generation failed, retrying...", exc_info=True)
-                    continue
-
-                state = status_data.get("state")
-                if state == "completed":
-                    video_with_audio_url = status_data["assets"]["video"]
-                    logger.info(f"✅ Video with audio is ready: {video_with_audio_url}")
-                    return video_with_audio_url
-                elif state == "failed":
-                    reason = status_data.get("failure_reason", "Unknown error")
-                    raise Exception(f"Audio generation failed: {reason}")
-                else:
-                    logger.info(f"Audio status: {state}... Waiting...")
-
-        return video_url
+            audio_prompt = audio_prompt_future.result(timeout=AUDIO_PROMPT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"⚠️ Audio prompt unavailable, keeping silent video: {e}")
+            return video_url
+        if not audio_prompt:
+            return video_url
+        audio_generation_id = submit_luma_audio(generation_id, audio_prompt)
+        logger.info(f"Polling audio generation (ID: {audio_generation_id})...")
+        return track("luma-audio", audio_generation_id, check_luma_audio, max_wait=AUDIO_TIMEOUT)
+
+    return then(video_future, _add_audio)
+
+
+def resume_luma_video(generation_id: str, prompt: str) -> Future:
+    """Повторно ставит на опрос уже отправленную генерацию (после перезапуска воркера)."""
+    return _track_video_with_audio(generation_id, prompt, first_delay=0)
+
 
+def start_video_with_luma(
+    prompt: str,
+    image_url: Optional[str] = None,
+    aspect_ratio: Optional[str] = None
+) -> Future:
+    """Запускает генерацию видео (и затем звука) и возвращает Future с итоговым URL."""
+    generation_id = submit_luma_video(prompt, aspect_ratio)
+    return _track_video_with_audio(generation_id, prompt)
+
+
+def generate_video_with_luma(
+    prompt: str,
+    image_url: Optional[str] = None,
+    aspect_ratio: Optional[str] = None
+) -> str:
+    try:
+        return start_video_with_luma(prompt, image_url, aspect_ratio).result()
     except Exception as e:
         logger.exception(f"❌ Error during LumaAI generation: {e}")
         raise
@@ -1,16 +1,21 @@
 ﻿import os
-import time
 import json
+from concurrent.futures import Future
 from typing import Optional
 import requests
 from dotenv import load_dotenv
+from utils import http
+from utils.rate_limit import SUBMIT, POLL
 from utils.logger import setup_logger
+from services.webhook_server import callback_url, is_enabled as webhooks_enabled
+from services.poller import PollResult, PENDING, COMPLETED, FAILED, track
 
 load_dotenv()
 logger = setup_logger("Runway")
 
 API_BASE = "https://api.kie.ai"
 API_TOKEN = os.getenv("KIEAI_API_KEY")
+QUOTA_KEY = "kieai"  # бюджет запросов общий для всех движков на этом ключе
 
 if not API_TOKEN:
     raise ValueError("Missing KIEAI_API_KEY environment variable")
@@ -25,7 +30,7 @@ REQUEST_TIMEOUT = 60          # max per-request timeout in seconds
 MAX_WAIT_TIME = 600           # total timeout for generation (10 minutes)
 
 
-def generate_runway_video(
+def submit_runway_task(
     prompt: str,
     image_url: Optional[str] = None,
     duration: int = 8,
@@ -33,22 +38,22 @@ def generate_runway_video(
     aspect_ratio: Optional[str] = None
 ) -> str:
     """
-    Generates a video using Runway model and returns the result URL.
+    Sends a Runway generation request and returns its taskId.
     """
-    session = requests.Session()
     payload = {
         "prompt": prompt,
         "imageUrl": image_url or "",
         "duration": duration,
         "quality": quality,
-        "aspectRatio": aspect_ratio
+        "aspectRatio": aspect_ratio,
+        "callBackUrl": callback_url("runway")
     }
 
-    # Step 1 — Send generation request
     try:
         logger.info("🚀 Sending video generation request to Runway...")
-        response = session.post(
+        response = http.post(
             f"{API_BASE}/api/v1/runway/generate",
+            quota=(QUOTA_KEY, SUBMIT),
             headers=HEADERS,
             json=payload,
             timeout=REQUEST_TIMEOUT
@@ -66,46 +71,69 @@ def generate_runway_video(
         logger.exception(f"❌ Failed to start Runway generation: {e}")
         raise
 
-    logger.info(f"🕒 Polling status for taskId={task_id} (timeout: {MAX_WAIT_TIME // 60} min)")
-    start_time = time.time()
-
-    # Step 2 — Poll for result
-    while True:
-        if time.time() - start_time > MAX_WAIT_TIME:
-            raise TimeoutError("Runway video generation timed out after 10 minutes")
-
-        time.sleep(30)
-
-        try:
-            poll_response = session.get(
-                f"{API_BASE}/api/v1/runway/record-detail",
-                headers=HEADERS,
-                params={"taskId": task_id},
-                timeout=REQUEST_TIMEOUT
-            )
-            poll_response.raise_for_status()
-            data = poll_response.json().get("data", {})
-        except requests.RequestException as e:
-            logger.warning(f"⚠️ Polling error, retrying: {e}")
-            continue
-
-        state = data.get("state")
-        logger.info(f"Runway generation state: {state}")
-
-        if state == "success":
-            video_url = data.get("videoInfo", {}).get("videoUrl")
-            if not video_url:
-                raise Exception("Generation completed but videoUrl is missing")
-            logger.info(f"✅ Runway video is ready: {video_url}")
-            return video_url
-
-        elif state == "fail":
-            error_msg = data.get("errorMessage") or data.get("failMsg") or "Unknown generation failure"
-            raise Exception(f"Runway generation failed: {error_msg}")
-
-        elif state in ["wait", "queueing", "generating"]:
-            logger.debug("⏳ Still generating...")
-            continue
-
-        else:
-            raise Exception(f"Unknown task state returned: {state}")
+    return task_id
+
+
+def check_runway_task(task_id: str) -> PollResult:
+    """
+    Polls the Runway task status once.
+    """
+    poll_response = http.get(
+        f"{API_BASE}/api/v1/runway/record-detail",
+        quota=(QUOTA_KEY, POLL),
+        headers=HEADERS,
+        params={"taskId": task_id},
+        timeout=REQUEST_TIMEOUT
+    )
+    poll_response.raise_for_status()
+    data = poll_response.json().get("data", {})
+
+    state = data.get("state")
+    logger.info(f"Runway generation state: {state}")
+
+    if state == "success":
+        video_url = data.get("videoInfo", {}).get("videoUrl")
+        if not video_url:
+            return PollResult(FAILED, error="Generation completed but videoUrl is missing")
+        logger.info(f"✅ Runway video is ready: {video_url}")
+        return PollResult(COMPLETED, video_url)
+
+    elif state == "fail":
+        error_msg = data.get("errorMessage") or data.get("failMsg") or "Unknown generation failure"
+        return PollResult(FAILED, error=f"Runway generation failed: {error_msg}")
+
+    elif state in ["wait", "queueing", "generating"]:
+        return PollResult(PENDING)
+
+    else:
+        return PollResult(FAILED, error=f"Unknown task state returned: {state}")
+
+
+def start_runway_video(
+    prompt: str,
+    image_url: Optional[str] = None,
+    duration: int = 8,
+    quality: str = "720p",
+    aspect_ratio: Optional[str] = None
+) -> Future:
+    """
+    Starts a Runway generation and returns a Future resolving to the video URL.
+    """
+    task_id = submit_runway_task(prompt, image_url, duration, quality, aspect_ratio)
+    return track(
+        "runway", task_id, check_runway_task,
+        max_wait=MAX_WAIT_TIME, callbacks=webhooks_enabled(), model=f"{quality}-{duration}s"
+    )
+
+
+def generate_runway_video(
+    prompt: str,
+    image_url: Optional[str] = None,
+    duration: int = 8,
+    quality: str = "720p",
+    aspect_ratio: Optional[str] = None
+) -> str:
+    """
+    Generates a video using Runway model and returns the result URL.
+    """
+    return start_runway_video(prompt, image_url, duration, quality, aspect_ratio).result()
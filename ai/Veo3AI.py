@@ -1,16 +1,21 @@
 ﻿import os
-import time
 import json
+from concurrent.futures import Future
 from typing import Optional
 from dotenv import load_dotenv
 import requests
+from utils import http
+from utils.rate_limit import SUBMIT, POLL
 from utils.logger import setup_logger
+from services.webhook_server import callback_url, is_enabled as webhooks_enabled
+from services.poller import PollResult, PENDING, COMPLETED, FAILED, track
 
 load_dotenv()
 logger = setup_logger("Veo3")
 
 API_BASE = "https://api.kie.ai"
 API_TOKEN = os.getenv("KIEAI_API_KEY")
+QUOTA_KEY = "kieai"  # бюджет запросов общий для всех движков на этом ключе
 
 if not API_TOKEN:
     raise ValueError("Missing KIEAI_API_KEY environment variable")
@@ -23,27 +28,29 @@ HEADERS = {
 
 REQUEST_TIMEOUT = 60         # максимум 60 секунд на один запрос
 MAX_WAIT_TIME = 600          # максимум 10 минут общее ожидание генерации
+MODEL = "veo3_fast"
 
 
-def generate_video_with_veo3(
+def submit_veo3_task(
     prompt: str,
     image_url: Optional[str] = None,
     aspect_ratio: Optional[str] = None
 ) -> str:
-    session = requests.Session()
-
+    """Отправляет задачу генерации в Veo 3 и возвращает её taskId."""
     payload = {
         "prompt": prompt,
         "enableTranslation": True,
         "imageUrls": [image_url] if image_url else [],
-        "model": "veo3_fast",
-        "aspectRatio": aspect_ratio
+        "model": MODEL,
+        "aspectRatio": aspect_ratio,
+        "callBackUrl": callback_url("veo3")
     }
 
     try:
         logger.info("🚀 Sending video generation request...")
-        response = session.post(
+        response = http.post(
             f"{API_BASE}/api/v1/veo/generate",
+            quota=(QUOTA_KEY, SUBMIT),
             headers=HEADERS,
             json=payload,
             timeout=REQUEST_TIMEOUT
@@ -62,41 +69,52 @@ def generate_video_with_veo3(
         logger.exception(f"❌ Request failed during generation start: {e}")
         raise
 
-    logger.info(f"🕒 Polling taskId={task_id} (max wait: {MAX_WAIT_TIME // 60} min)...")
-    start_time = time.time()
-
-    while True:
-        elapsed = time.time() - start_time
-        if elapsed > MAX_WAIT_TIME:
-            raise TimeoutError(f"Video generation timed out after {MAX_WAIT_TIME} seconds")
-
-        time.sleep(30)
-
-        try:
-            poll_response = session.get(
-                f"{API_BASE}/api/v1/veo/record-info",
-                params={"taskId": task_id},
-                headers=HEADERS,
-                timeout=REQUEST_TIMEOUT
-            )
-            poll_response.raise_for_status()
-            poll_data = poll_response.json().get("data", {})
-        except requests.RequestException as e:
-            logger.warning(f"⚠️ Polling failed, retrying: {e}")
-            continue
-
-        status = poll_data.get("successFlag")
-        if status == 0:
-            logger.info("⏳ Video generation in progress...")
-            continue
-        elif status == 1:
-            urls = poll_data.get("response", {}).get("resultUrls", [])
-            if not urls:
-                raise Exception("Generation finished but no video URL returned")
-            logger.info(f"✅ Video ready: {urls[0]}")
-            return urls[0]
-        elif status in [2, 3]:
-            raise Exception(f"Video generation failed: {poll_data.get('errorMessage', 'Unknown error')}")
-        else:
-            raise Exception(f"Unknown status code: {status}")
+    return task_id
+
+
+def check_veo3_task(task_id: str) -> PollResult:
+    """Один опрос статуса задачи Veo 3."""
+    poll_response = http.get(
+        f"{API_BASE}/api/v1/veo/record-info",
+        quota=(QUOTA_KEY, POLL),
+        params={"taskId": task_id},
+        headers=HEADERS,
+        timeout=REQUEST_TIMEOUT
+    )
+    poll_response.raise_for_status()
+    poll_data = poll_response.json().get("data", {})
+
+    status = poll_data.get("successFlag")
+    if status == 0:
+        return PollResult(PENDING)
+    elif status == 1:
+        urls = poll_data.get("response", {}).get("resultUrls", [])
+        if not urls:
+            return PollResult(FAILED, error="Generation finished but no video URL returned")
+        logger.info(f"✅ Video ready: {urls[0]}")
+        return PollResult(COMPLETED, urls[0])
+    elif status in [2, 3]:
+        return PollResult(FAILED, error=f"Video generation failed: {poll_data.get('errorMessage', 'Unknown error')}")
+    else:
+        return PollResult(FAILED, error=f"Unknown status code: {status}")
+
+
+def start_video_with_veo3(
+    prompt: str,
+    image_url: Optional[str] = None,
+    aspect_ratio: Optional[str] = None
+) -> Future:
+    """Запускает генерацию и возвращает Future с URL видео, не блокируя поток."""
+    task_id = submit_veo3_task(prompt, image_url, aspect_ratio)
+    return track(
+        "veo3", task_id, check_veo3_task,
+        max_wait=MAX_WAIT_TIME, callbacks=webhooks_enabled(), model=MODEL
+    )
+
 
+def generate_video_with_veo3(
+    prompt: str,
+    image_url: Optional[str] = None,
+    aspect_ratio: Optional[str] = None
+) -> str:
+    return start_video_with_veo3(prompt, image_url, aspect_ratio).result()
@@ -0,0 +1,40 @@
+import json
+
+from utils import llm
+
+BATCH_OUTPUT_INSTRUCTIONS = """
+    📦 Batch output (overrides the single-idea output instruction above):
+    Generate {n} different ideas that each follow all the rules above. Make them clearly distinct from each other.
+    Each idea must be written exactly in the output format described above.
+    Return ONLY a JSON object of the form {{"ideas": ["idea 1", "idea 2", ...]}} with exactly {n} strings.
+"""
+
+
+def batch_instructions(n: int) -> str:
+    return BATCH_OUTPUT_INSTRUCTIONS.format(n=n)
+
+
+def parse_ideas(content: str, n: int) -> list[str]:
+    """Разбирает JSON-ответ {"ideas": [...]}: только непустые уникальные строки, не больше n."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid JSON batch response from OpenAI: {content!r}")
+
+    items = data.get("ideas") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError(f"Batch response has no 'ideas' list: {content!r}")
+
+    ideas = []
+    for item in items:
+        if isinstance(item, str) and item.strip() and item.strip() not in ideas:
+            ideas.append(item.strip())
+    if not ideas:
+        raise ValueError(f"Batch response contains no usable ideas: {content!r}")
+    return ideas[:n]
+
+
+def request_ideas(call_site: str, messages: list[dict], n: int) -> list[str]:
+    """Один запрос к gpt-4o-mini за n идеями сразу вместо n отдельных запросов."""
+    content = llm.complete(call_site, messages, response_format={"type": "json_object"})
+    return parse_ideas(content, n)
@@ -1,11 +1,6 @@
 ﻿import random
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from utils import llm
 
 CATEGORIES = [
     "Lifehacks and how-to tricks",
@@ -54,15 +49,7 @@ def get_custom_topic_from_category() -> str:
         f"The topic must work visually in 10 seconds, interest people from any country, and be concrete, clean, and realistic."
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-    )
-
-    content = response.choices[0].message.content
-    if not isinstance(content, str):
-        raise ValueError(f"Некорректный ответ от OpenAI: {response}")
-    return content
\ No newline at end of file
+    return llm.complete("prompt.category_topic", [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ])
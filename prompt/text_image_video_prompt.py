@@ -1,14 +1,45 @@
-﻿from openai import OpenAI
-from dotenv import load_dotenv
+﻿import base64
 import os
 import random
 
-load_dotenv()
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def generate_portrait_prompt() -> str:
-    user_prompt = """
+import cv2
+import numpy as np
+
+from prompt.batch import batch_instructions, request_ideas
+from utils import http, llm
+from utils.logger import setup_logger
+
+logger = setup_logger("ScenePrompt")
+
+# Вместо ссылки на полноразмерную картинку Midjourney отправляем в GPT уменьшенную копию
+# (base64, detail=low): OpenAI не скачивает оригинал, а картинка стоит фиксированные 85 токенов.
+SCENE_THUMBNAIL = os.getenv("SCENE_THUMBNAIL", "1") == "1"
+THUMBNAIL_MAX_SIDE = 512
+THUMBNAIL_JPEG_QUALITY = 85
+
+def _image_input(image_url: str) -> dict:
+    """Блок image_url для vision-запроса: миниатюра, если получилось её сделать, иначе исходная ссылка."""
+    if SCENE_THUMBNAIL:
+        try:
+            response = http.get(image_url)
+            response.raise_for_status()
+            image = cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("could not decode image")
+            height, width = image.shape[:2]
+            scale = THUMBNAIL_MAX_SIDE / max(height, width)
+            if scale < 1:
+                image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+            if not ok:
+                raise ValueError("could not encode thumbnail")
+            data = base64.b64encode(encoded.tobytes()).decode("ascii")
+            return {"url": f"data:image/jpeg;base64,{data}", "detail": "low"}
+        except Exception as e:
+            logger.warning(f"⚠️ Thumbnail for {image_url} failed, sending original URL: {e}")
+    return {"url": image_url}
+
+PORTRAIT_PROMPT = """
         You are a creative AI that generates **ultra-realistic and visually striking photo concepts** featuring humans, animals, surreal creatures, robots, or strange combinations of them (like a man with a banana peel on his head or a cyborg drinking boba tea). Your concepts will become scroll-stopping still images — later turned into short viral videos.
 
         🎯 Your goal:  
@@ -40,19 +71,10 @@ def generate_portrait_prompt() -> str:
     """
 
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": user_prompt}],
-    )
-
-    content = response.choices[0].message.content
-    if not isinstance(content, str):
-        raise ValueError(f"Invalid response from OpenAI: {response}")
-
-    return content
+def generate_portrait_prompt() -> str:
+    return llm.complete("prompt.portrait", [{"role": "user", "content": PORTRAIT_PROMPT}])
 
-def generate_image_prompt() -> str:
-    user_prompt = """
+IMAGE_PROMPT = """
         You are a creative AI that generates bold, strange, and viral ideas for TikTok-style short videos — but your concept will first be turned into a **single still image**, and only then into a video.
 
         🎯 Your goal:
@@ -94,16 +116,17 @@ def generate_image_prompt() -> str:
         Example ending: *photorealistic, cinematic lighting, shallow depth of field, f/1.4, ISO 100, 4k*
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": user_prompt}],
-    )
 
-    content = response.choices[0].message.content
-    if not isinstance(content, str):
-        raise ValueError(f"Invalid response from OpenAI: {response}")
+def generate_image_prompt() -> str:
+    return llm.complete("prompt.image", [{"role": "user", "content": IMAGE_PROMPT}])
+
+def generate_portrait_prompts(n: int) -> list[str]:
+    """n портретных концептов одним запросом (для пула промптов)."""
+    return request_ideas("prompt.portrait_batch", [{"role": "user", "content": PORTRAIT_PROMPT + batch_instructions(n)}], n)
 
-    return content
+def generate_image_prompts(n: int) -> list[str]:
+    """n концептов картинок одним запросом (для пула промптов)."""
+    return request_ideas("prompt.image_batch", [{"role": "user", "content": IMAGE_PROMPT + batch_instructions(n)}], n)
 
 def generate_prompt(image_url: str, prompt_text: str) -> str:
     """
@@ -145,19 +168,12 @@ def generate_prompt(image_url: str, prompt_text: str) -> str:
             "text": f"""Original prompt: {prompt_text}
                 Now, based on this image and the scene it shows, describe a short 5–10 second video as if you're telling someone what happens in it."""
         },
-        {"type": "image_url", "image_url": {"url": image_url}},
+        {"type": "image_url", "image_url": _image_input(image_url)},
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": user_content},
-        ],
-    )
-
-    content = response.choices[0].message.content
-    if not isinstance(content, str):
-        raise ValueError("Invalid GPT response")
+    content = llm.complete("prompt.scene", [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": user_content},
+    ])
 
     return content.strip()
\ No newline at end of file
@@ -1,15 +1,10 @@
-﻿from openai import OpenAI
-from dotenv import load_dotenv
-import os
-import random
+﻿import random
 
-load_dotenv()
+from prompt.batch import batch_instructions, request_ideas
+from utils import llm
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-
-def generate_prompt() -> str:
-    user_prompt = """
+TEXT_TO_VIDEO_PROMPT = """
     You are a creative AI that generates short, weird, and hyper-viral video ideas for TikTok-style AI tools like Veo, Seeme, Kling, Runway, or Pika.
 
     🎯 Your goal:  
@@ -43,15 +38,16 @@ def generate_prompt() -> str:
     """
 
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "user", "content": user_prompt}
-        ],
-    )
+def generate_prompt() -> str:
+    return llm.complete("prompt.text_to_video", [
+        {"role": "user", "content": TEXT_TO_VIDEO_PROMPT}
+    ])
 
-    content = response.choices[0].message.content
-    if not isinstance(content, str):
-        raise ValueError(f"Invalid response from OpenAI: {response}")
 
-    return content
\ No newline at end of file
+def generate_prompts(n: int) -> list[str]:
+    """n идей одним запросом (для пула промптов)."""
+    return request_ideas(
+        "prompt.text_to_video_batch",
+        [{"role": "user", "content": TEXT_TO_VIDEO_PROMPT + batch_instructions(n)}],
+        n
+    )
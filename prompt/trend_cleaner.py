@@ -1,10 +1,7 @@
-﻿from openai import OpenAI
-from dotenv import load_dotenv
-import os
+﻿from utils import llm
 
-load_dotenv()
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Один и тот же заголовок тренда приходит снова в следующих циклах
+CLEAN_TOPIC_CACHE_TTL = 7 * 24 * 60 * 60
 
 def clean_topic(topic: str) -> str:
     system_prompt = (
@@ -25,14 +22,9 @@ def clean_topic(topic: str) -> str:
 
     user_prompt = f"Clean, rephrase, and adapt this news input to be safe and friendly: \"{topic}\""
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-    )
-
-    cleaned = response.choices[0].message.content.strip()
+    cleaned = llm.complete("trend_cleaner", [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ], cache_ttl=CLEAN_TOPIC_CACHE_TTL).strip()
     print(f"[trend_cleaner] Отфильтрованная тема: {cleaned}")
     return cleaned
\ No newline at end of file
@@ -1,11 +1,23 @@
 ﻿import asyncio
-from services.autogen import queue_generation_tasks
 from utils.logger import setup_logger
 
 logger = setup_logger("SeemeGo Setup")
 
 async def periodic_video_generation():
+    # Импорт внутри функции: процессы services/media_pool (spawn) заново импортируют этот файл,
+    # а им не нужны воркеры очереди и остальная оркестрация
+    from services.autogen import queue_generation_tasks, resume_provider_tasks
+    from services.webhook_server import start_webhook_server
+
     logger.info("🎬 Video generation loop started.")
+    try:
+        start_webhook_server()
+    except Exception:
+        logger.exception("❌ Failed to start webhook server, falling back to polling:")
+    try:
+        resume_provider_tasks()
+    except Exception:
+        logger.exception("❌ Error while resuming provider tasks:")
     while True:
         try:
             logger.info("🔁 Starting a new video generation cycle...")
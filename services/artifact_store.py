@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from utils.db import transaction
+from utils.logger import setup_logger
+
+logger = setup_logger("ArtifactStore")
+
+# Файлы, которые отдаются наружу по URL (обложки), лежат в ARTIFACT_DIR под именем
+# по хэшу содержимого. Пока задача не завершена, её файлы не удаляются; остальные
+# вытесняются по давности использования, когда папка превышает лимит размера или возраста.
+ARTIFACT_DIR = "temp-seemeego"
+SCRATCH_DIR = os.path.join(ARTIFACT_DIR, ".scratch")   # временные файлы (скачанные видео)
+MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", 512 * 1024 * 1024))
+MAX_AGE = float(os.getenv("ARTIFACT_MAX_AGE", 7 * 24 * 60 * 60))
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS artifacts (
+        name TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS artifact_refs (
+        job_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (job_id, name)
+    )
+    """,
+]
+
+_evict_lock = threading.Lock()
+
+
+def _path(name: str) -> str:
+    return os.path.join(ARTIFACT_DIR, name)
+
+
+def _add_ref(conn, job_id: Optional[str], name: str) -> None:
+    if job_id:
+        conn.execute("INSERT OR IGNORE INTO artifact_refs (job_id, name) VALUES (?, ?)", (job_id, name))
+
+
+def put(path: str, suffix: str, job_id: Optional[str] = None) -> str:
+    """
+    Переносит готовый файл (обычно из scratch_file) в хранилище под именем sha256 + suffix
+    и возвращает новый путь. Запись атомарная: os.replace в пределах одной папки.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    name = digest.hexdigest()[:32] + suffix
+    size = os.path.getsize(path)
+    target = _path(name)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.replace(path, target)
+
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO artifacts (name, size, created_at, last_used) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET last_used = excluded.last_used
+            """,
+            (name, size, now, now)
+        )
+        _add_ref(conn, job_id, name)
+    evict()
+    return target
+
+
+def release(job_id: str) -> None:
+    """Задача завершена: её артефакты больше не держатся и могут быть вытеснены."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM artifact_refs WHERE job_id = ?", (job_id,))
+
+
+@contextmanager
+def scratch_file(suffix: str) -> Iterator[str]:
+    """Путь к временному файлу, который удаляется по выходу из блока (или при следующем запуске)."""
+    path = os.path.join(SCRATCH_DIR, f"{uuid.uuid4().hex}{suffix}")
+    try:
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def evict() -> None:
+    """Удаляет неиспользуемые артефакты: старше MAX_AGE и самые давние, пока размер больше MAX_BYTES."""
+    with _evict_lock:
+        with transaction() as conn:
+            rows = conn.execute(
+                """
+                SELECT name, size, last_used,
+                    EXISTS (SELECT 1 FROM artifact_refs r WHERE r.name = a.name) AS referenced
+                FROM artifacts a ORDER BY last_used
+                """
+            ).fetchall()
+        total = sum(row["size"] for row in rows)
+        cutoff = time.time() - MAX_AGE
+        victims = []
+        for row in rows:
+            if row["referenced"]:
+                continue
+            if row["last_used"] < cutoff or total > MAX_BYTES:
+                victims.append(row["name"])
+                total -= row["size"]
+        if not victims:
+            return
+
+        for name in victims:
+            try:
+                os.remove(_path(name))
+            except FileNotFoundError:
+                pass
+        with transaction() as conn:
+            conn.executemany("DELETE FROM artifacts WHERE name = ?", [(name,) for name in victims])
+        logger.info(f"🧹 Evicted {len(victims)} artifact(s), {total / 1e6:.1f} MB left")
+
+
+def reconcile() -> None:
+    """
+    Сверяет папку с базой при старте: удаляет брошенные временные файлы,
+    забывает записи без файлов и берёт на учёт файлы, о которых база не знает
+    (они вытесняются по обычным правилам), затем применяет лимиты.
+    """
+    for name in os.listdir(SCRATCH_DIR):
+        os.remove(os.path.join(SCRATCH_DIR, name))
+
+    with transaction() as conn:
+        known = {row["name"] for row in conn.execute("SELECT name FROM artifacts").fetchall()}
+        on_disk = {
+            entry.name: entry.stat() for entry in os.scandir(ARTIFACT_DIR)
+            if entry.is_file() and not entry.name.startswith(".")
+        }
+        missing = known - on_disk.keys()
+        conn.executemany("DELETE FROM artifacts WHERE name = ?", [(name,) for name in missing])
+        conn.executemany("DELETE FROM artifact_refs WHERE name = ?", [(name,) for name in missing])
+        adopted = [
+            (name, stat.st_size, stat.st_mtime, stat.st_mtime)
+            for name, stat in on_disk.items() if name not in known
+        ]
+        conn.executemany(
+            "INSERT INTO artifacts (name, size, created_at, last_used) VALUES (?, ?, ?, ?)",
+            adopted
+        )
+    if missing or adopted:
+        logger.info(f"🔎 Reconciled {ARTIFACT_DIR}: adopted {len(adopted)} untracked file(s), dropped {len(missing)} stale record(s)")
+    evict()
+
+
+def _init() -> None:
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    with transaction() as conn:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+    reconcile()
+
+
+_init()
@@ -1,91 +1,277 @@
 ﻿from prompt.text_to_video_prompt import generate_prompt 
 
-from generators.text_to_video import generate_text_to_video
-from services.choose_generate_video import choose_video_generator
+from services.choose_generate_video import choose_video_generator, hedged, reset_hedge_budget
 from services.task_manager import enqueue_task
-from services.convert_cover_image import extract_frame_from_video, generate_image_url
+from services.provider_tasks import resumable, resume_all
+from services import artifact_store, checkpoints, engine_stats, media_pool, prompt_pool
+from utils import llm
+from services.convert_cover_image import download_video, save_cover
 from services.seeme_video_import import get_ai_service_id, import_video
+from services.video_qc import inspect_video
 from trends.selector import get_random_trend
 from prompt.category_prompt import get_custom_topic_from_category
+import os
 import random
 import logging
-from prompt.text_image_video_prompt import (
-    generate_image_prompt,
-    generate_portrait_prompt,
-    generate_prompt as generate_scene_prompt
-)
-from ai.MidjourneyAI import generate_image_with_midjourney
+from prompt.text_image_video_prompt import generate_prompt as generate_scene_prompt
+from ai.MidjourneyAI import start_image_with_midjourney
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 MAX_RETRIES = 1
 
-def enqueue_with_retry(task_func, current_try=0):
+# Пайплайны, для которых скорость важнее стоимости: генерация видео в них хеджируется
+# вторым движком (см. choose_generate_video.hedged). Через запятую, по умолчанию выключено.
+HEDGE_PIPELINES = {kind.strip() for kind in os.getenv("HEDGE_PIPELINES", "").split(",") if kind.strip()}
+
+# Midjourney возвращает несколько картинок за одну генерацию. С MJ_FAN_OUT=1 каждая
+# становится отдельной задачей со своим промптом сцены и движком (и своей оплатой генерации видео).
+# По умолчанию выключено: используется одна картинка.
+MJ_FAN_OUT = os.getenv("MJ_FAN_OUT", "0") == "1"
+
+# Этапы каждого пайплайна по порядку: (checkpoint этапа, пул воркеров task_manager).
+# Каждый этап выполняется в своём пуле, поэтому 10-минутная генерация видео
+# не задерживает быстрые запросы к GPT и импорт. Обложку для text-to-video
+# (checkpoint "cover") сохраняет этап qc — из тех же декодированных кадров.
+PIPELINES = {
+    "text-to-video": [
+        ("prompt", "llm"),
+        ("video", "video"),
+        ("qc", "frames"),
+        ("import", "import"),
+    ],
+    "portrait-to-video": [
+        ("prompt", "llm"),
+        ("image", "image"),
+        ("scene", "llm"),
+        ("video", "video"),
+        ("qc", "frames"),
+        ("import", "import"),
+    ],
+    "image-to-video": [
+        ("prompt", "llm"),
+        ("image", "image"),
+        ("scene", "llm"),
+        ("video", "video"),
+        ("qc", "frames"),
+        ("import", "import"),
+    ],
+}
+
+# Этап отправлен провайдеру, результат сохранит _on_complete
+_STARTED = object()
+# Этап отменил результаты предыдущих этапов (например, qc забраковал видео) — они выполнятся заново
+_REROUTED = object()
+
+def enqueue_with_retry(task_func, current_try=0, job_id=None):
+    """
+    Повторная попытка продолжает задачу с того этапа, на котором она упала:
+    результаты уже пройденных этапов лежат в checkpoints под тем же job_id.
+    """
     if current_try < MAX_RETRIES:
-        enqueue_task(lambda: task_func(current_try + 1))
+        enqueue_task(task_func, current_try + 1, job_id)
     else:
         logger.warning(f"🚫 Too many retries for task {task_func.__name__}. Dropping after {MAX_RETRIES} attempts.")
+        if job_id:
+            checkpoints.clear(job_id)
+            artifact_store.release(job_id)
 
-def process_text_to_video_generation(current_try=0):
-    try:
-        description = generate_text_to_video()
-        name, generator_func = choose_video_generator(for_image=False)
-        aspect_ratio = "9:16"
-        video_url = generator_func(description, aspect_ratio=aspect_ratio)
-
-        if not video_url:
-            logger.warning("No video URL returned (text-to-video), re-enqueueing...")
-            enqueue_with_retry(process_text_to_video_generation, current_try)
+def _on_complete(future, job_id, stage, retry_func, current_try):
+    """
+    Продолжает цепочку, когда провайдер закончит генерацию.
+    Рабочий поток не ждёт результата: результат сохраняется как checkpoint этапа,
+    и задача снова ставится в очередь, чтобы перейти к следующему этапу.
+    Ошибка генерации приводит к повторной попытке этого же этапа.
+    Та же функция продолжает задачи, восстановленные после перезапуска
+    (см. resume_provider_tasks).
+    """
+    def _done(f):
+        if f.cancelled():
             return
-        
-        logger.info(f"[text-to-video] ✅ Prompt: {description}, engine={name}, 🎬 URL: {video_url}")
-        
-        image_path = extract_frame_from_video(video_url, at_second=1.0)
-        image_url = generate_image_url(image_path)
-        try:
-            ai_id = get_ai_service_id(name)
-            response = import_video(image_url, video_url, ai_id)
-            logger.info(f"Imported video to server: {response}")
-        except Exception as e:
-            logger.exception(f"❌ Error importing video: {e}")
+        error = f.exception()
+        if error is not None:
+            logger.error(f"❌ [{job_id}] Stage '{stage}' failed ({retry_func.__name__}): {error}")
+            enqueue_with_retry(retry_func, current_try, job_id)
+            return
+        checkpoints.save(job_id, stage, f.result())
+        enqueue_task(retry_func, current_try, job_id)
 
-    except Exception as e:
-        logger.exception(f"❌ Error in text-to-video generation: {e}")
-        enqueue_with_retry(process_text_to_video_generation, current_try)
+    future.add_done_callback(_done)
 
-def _run_image_to_video(prompt_func, retry_func, current_try=0):
-    try:
-        prompt = prompt_func()
-        image_url, aspect_ratio = generate_image_with_midjourney(prompt, mode="mj_txt2img") 
-        description = generate_scene_prompt(image_url, prompt)
-        name, generator_func = choose_video_generator(for_image=True)
-        video_url = generator_func(description, image_url, aspect_ratio=aspect_ratio)
-
-        if not video_url:
-            logger.warning("No video URL returned (image-to-video), re-enqueueing...")
-            enqueue_with_retry(lambda t=current_try: retry_func(t), current_try)
+def _start_stage(job_id, stage, retry_func, current_try, start_func, *args, **kwargs):
+    continuation = (job_id, stage, retry_func, current_try)
+    with resumable(_on_complete, *continuation):
+        future = start_func(*args, **kwargs)
+    _on_complete(future, *continuation)
+    return _STARTED
+
+def _fan_out_images(kind, job_id, state, current_try):
+    """Каждая картинка Midjourney продолжает пайплайн отдельной задачей с этапа scene."""
+    images = state["image"]
+    logger.info(f"[{job_id}] 🪄 Fanning out {len(images)} Midjourney images into separate jobs")
+    for image in images:
+        child_id = checkpoints.new_job_id()
+        for stage, value in state.items():
+            if stage != "image":
+                checkpoints.save(child_id, stage, value)
+        checkpoints.save(child_id, "image", image)
+        _schedule(kind, child_id, current_try)
+    checkpoints.clear(job_id)
+
+def _schedule(kind, job_id, current_try):
+    """Ставит первый незавершённый этап задачи в очередь его пула."""
+    state = checkpoints.load(job_id)
+    image = state.get("image")
+    if image and isinstance(image[0], list):
+        _fan_out_images(kind, job_id, state, current_try)
+        return
+    for stage, pool in PIPELINES[kind]:
+        if stage not in state:
+            enqueue_task(_run_stage, kind, stage, job_id, current_try, queue=pool)
             return
-        
-        tag = "portrait-to-video" if prompt_func is generate_portrait_prompt else "image-to-video"
-        logger.info(f"[{tag}] ✅ Prompt: {description}, engine={name}, 🎬 URL: {video_url}")
+    checkpoints.clear(job_id)
+    artifact_store.release(job_id)
+
+def _run_stage(kind, stage, job_id, current_try=0):
+    entry = _ENTRY_POINTS[kind]
+    try:
+        state = checkpoints.load(job_id)
+        if stage in state:
+            logger.info(f"[{job_id}] ⏭️ Stage '{stage}' already done")
+        else:
+            result = _STAGE_HANDLERS[stage](kind, job_id, state, current_try)
+            if result is _STARTED:
+                return
+            if result is not _REROUTED:
+                checkpoints.save(job_id, stage, result)
+        _schedule(kind, job_id, current_try)
+    except Exception as e:
+        logger.exception(f"❌ [{job_id}] Error in {kind} generation, stage '{stage}': {e}")
+        enqueue_with_retry(entry, current_try, job_id)
+
+def _stage_prompt(kind, job_id, state, current_try):
+    return prompt_pool.get_prompt(kind)
 
+def _stage_image(kind, job_id, state, current_try):
+    return _start_stage(
+        job_id, "image", _ENTRY_POINTS[kind], current_try,
+        start_image_with_midjourney, state["prompt"], mode="mj_txt2img", fan_out=MJ_FAN_OUT
+    )
+
+def _stage_scene(kind, job_id, state, current_try):
+    image_url, _ = state["image"]
+    return generate_scene_prompt(image_url, state["prompt"])
+
+def _aspect_ratio(state):
+    return state["image"][1] if "image" in state else "9:16"
+
+def _stage_video(kind, job_id, state, current_try):
+    """
+    Если провайдер не принял задачу, сразу пробуем другой движок в этом же этапе:
+    промпт и картинка уже сохранены, повторная попытка их не пересоздаёт.
+    Движки, чьё видео для этой задачи забраковал этап qc, не используются.
+    """
+    for_image = "image" in state
+    aspect_ratio = _aspect_ratio(state)
+    if for_image:
+        args = (state["scene"], state["image"][0])
+    else:
+        args = (state["prompt"],)
+
+    tried = list(state.get("rejected_engines", []))
+    while True:
+        # Когда подходящих движков не осталось, бросает RuntimeError → обычный повтор этапа
+        name, generator_func = choose_video_generator(for_image=for_image, exclude=tried)
+        checkpoints.save(job_id, "engine", name)
+        if kind in HEDGE_PIPELINES:
+            generator_func = hedged(
+                name, generator_func, for_image,
+                on_winner=lambda engine: checkpoints.save(job_id, "engine", engine),
+                exclude=list(tried)
+            )
         try:
-            ai_id = get_ai_service_id(name)
-            response = import_video(image_url, video_url, ai_id)
-            logger.info(f"Imported video to server: {response}")
+            return _start_stage(
+                job_id, "video", _ENTRY_POINTS[kind], current_try,
+                generator_func, *args, aspect_ratio=aspect_ratio
+            )
         except Exception as e:
-            logger.exception(f"❌ Error importing video: {e}")
+            logger.warning(f"[{job_id}] ↪️ {name} did not accept the task ({e}), failing over")
+            tried.append(name)
 
-    except Exception as e:
-        logger.exception(f"❌ Error in image-to-video generation ({prompt_func.__name__}): {e}")
-        enqueue_with_retry(lambda t=current_try: retry_func(t), current_try)
+def _stage_qc(kind, job_id, state, current_try):
+    """
+    Проверяет готовое видео до импорта (см. video_qc). Забракованное видео генерируется заново
+    другим движком. Видео скачивается во временный файл и удаляется после проверки;
+    пайплайнам без картинки Midjourney тот же проход выбирает обложку.
+    """
+    needs_cover = "image" not in state
+    with artifact_store.scratch_file(".mp4") as video_path, artifact_store.scratch_file(".jpg") as cover_path:
+        download_video(state["video"], video_path)
+        report = media_pool.run(inspect_video, video_path, _aspect_ratio(state), cover_path if needs_cover else None)
+        problems = report.pop("problems")
+        engine_stats.record_qc(state["engine"], passed=not problems)
+        if not problems:
+            if needs_cover:
+                if "cover" not in report:
+                    raise RuntimeError(f"No cover frame could be selected from {state['video']}")
+                checkpoints.save(job_id, "cover", save_cover(cover_path, job_id=job_id))
+            logger.info(f"[{job_id}] 🔍 QC passed: {report}")
+            return report
 
-def process_portrait_image_to_video_generation(current_try=0):
-    _run_image_to_video(generate_portrait_prompt, process_portrait_image_to_video_generation, current_try)
+    engine = state["engine"]
+    logger.warning(f"[{job_id}] 🚫 QC rejected {engine} video ({'; '.join(problems)}), rerouting to another engine")
+    checkpoints.save(job_id, "rejected_engines", state.get("rejected_engines", []) + [engine])
+    checkpoints.discard(job_id, "video", "engine")
+    return _REROUTED
 
-def process_image_prompt_to_video_generation(current_try=0):
-    _run_image_to_video(generate_image_prompt, process_image_prompt_to_video_generation, current_try)
+def _stage_import(kind, job_id, state, current_try):
+    video_url, name = state["video"], state["engine"]
+    if "image" in state:
+        image_url = state["image"][0]
+        description = state["scene"]
+    else:
+        image_url = state["cover"]
+        description = state["prompt"]
+    logger.info(f"[{kind}] ✅ Prompt: {description}, engine={name}, 🎬 URL: {video_url}")
+
+    ai_id = get_ai_service_id(name)
+    response = import_video(image_url, video_url, ai_id)
+    logger.info(f"Imported video to server: {response}")
+    return response
+
+_STAGE_HANDLERS = {
+    "prompt": _stage_prompt,
+    "image": _stage_image,
+    "scene": _stage_scene,
+    "video": _stage_video,
+    "qc": _stage_qc,
+    "import": _stage_import,
+}
+
+def process_text_to_video_generation(current_try=0, job_id=None):
+    _schedule("text-to-video", job_id or checkpoints.new_job_id(), current_try)
+
+def process_portrait_image_to_video_generation(current_try=0, job_id=None):
+    _schedule("portrait-to-video", job_id or checkpoints.new_job_id(), current_try)
+
+def process_image_prompt_to_video_generation(current_try=0, job_id=None):
+    _schedule("image-to-video", job_id or checkpoints.new_job_id(), current_try)
+
+_ENTRY_POINTS = {
+    "text-to-video": process_text_to_video_generation,
+    "portrait-to-video": process_portrait_image_to_video_generation,
+    "image-to-video": process_image_prompt_to_video_generation,
+}
+
+def resume_provider_tasks():
+    """
+    Дожидается задач провайдеров, запущенных до перезапуска процесса,
+    и доводит их результат до обложки и импорта без повторной генерации.
+    """
+    resumed = resume_all()
+    if resumed:
+        logger.info(f"♻️ Resumed {resumed} in-flight provider task(s).")
 
 def queue_generation_tasks():
     """
@@ -118,6 +304,10 @@ def queue_generation_tasks():
     # else:
     #     logger.warning("No custom topic obtained, skipping enqueue for custom task.")
 
+    llm.log_metrics()
+    reset_hedge_budget()
+    for kind in PIPELINES:
+        prompt_pool.schedule_top_up(kind)
     enqueue_task(process_text_to_video_generation)
     enqueue_task(process_portrait_image_to_video_generation)
     enqueue_task(process_image_prompt_to_video_generation)
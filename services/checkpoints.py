@@ -0,0 +1,67 @@
+import json
+import time
+import uuid
+from typing import Any
+
+from utils.db import transaction
+from utils.logger import setup_logger
+
+logger = setup_logger("Checkpoints")
+
+# Незавершённые задачи старше этого срока считаются брошенными
+CHECKPOINT_TTL = 7 * 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, stage)
+)
+"""
+
+
+def _init() -> None:
+    with transaction() as conn:
+        conn.execute(_SCHEMA)
+        deleted = conn.execute(
+            "DELETE FROM checkpoints WHERE created_at < ?", (time.time() - CHECKPOINT_TTL,)
+        ).rowcount
+    if deleted:
+        logger.info(f"🧹 Removed {deleted} stale checkpoint(s).")
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def load(job_id: str) -> dict[str, Any]:
+    """Все сохранённые результаты этапов задачи: {stage: value}."""
+    with transaction() as conn:
+        rows = conn.execute("SELECT stage, value FROM checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+    return {row["stage"]: json.loads(row["value"]) for row in rows}
+
+
+def save(job_id: str, stage: str, value: Any) -> None:
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (job_id, stage, value, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, stage, json.dumps(value), time.time())
+        )
+
+
+def discard(job_id: str, *stages: str) -> None:
+    """Удаляет результаты отдельных этапов — они выполнятся заново."""
+    with transaction() as conn:
+        conn.executemany(
+            "DELETE FROM checkpoints WHERE job_id = ? AND stage = ?", [(job_id, stage) for stage in stages]
+        )
+
+
+def clear(job_id: str) -> None:
+    with transaction() as conn:
+        conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+
+_init()
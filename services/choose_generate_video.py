@@ -1,20 +1,33 @@
+import contextvars
+import os
 import random 
+import time
 import logging
-from typing import Callable, Tuple, List
+import threading
+from concurrent.futures import Future
+from typing import Callable, Iterable, Tuple, List
 
-from ai.Veo3AI import generate_video_with_veo3
-from ai.LumaAI import generate_video_with_luma
-from ai.RunwayAI import generate_runway_video
-from ai.MidjourneyAI import generate_image_with_midjourney
+from services import engine_stats, latency_stats
+from services.poller import MAX_WAIT_TIME
+from utils.circuit_breaker import CircuitOpenError, get_breaker
+from utils.rate_limit import RateLimitExceeded
+
+from ai.Veo3AI import start_video_with_veo3
+from ai.LumaAI import start_video_with_luma
+from ai.RunwayAI import start_runway_video
+from ai.MidjourneyAI import start_image_with_midjourney
 
 logger = logging.getLogger(__name__)
 
-# Категоризация генераторов с весами
+# Категоризация генераторов с базовыми весами.
+# Функции запускают генерацию и сразу возвращают Future с URL видео.
+# Фактический вес движка = базовый вес × множитель из engine_stats
+# (скорость, доля ошибок и время приёма задачи), в пределах ROUTER_*_WEIGHT_FACTOR.
 VIDEO_GENERATORS: List[Tuple[str, Callable, str, float]] = [
-    ("Veo 3 AI", generate_video_with_veo3, "universal", 0.5),
-    ("Luma AI", generate_video_with_luma, "universal", 0.166),
-    ("Runway AI", generate_runway_video, "universal", 0.167),
-    ("Midjourney AI", lambda prompt, image_url, aspect_ratio: generate_image_with_midjourney(
+    ("Veo 3 AI", start_video_with_veo3, "universal", 0.5),
+    ("Luma AI", start_video_with_luma, "universal", 0.166),
+    ("Runway AI", start_runway_video, "universal", 0.167),
+    ("Midjourney AI", lambda prompt, image_url, aspect_ratio: start_image_with_midjourney(
         prompt=prompt,
         image_url=image_url,
         aspect_ratio=aspect_ratio,
@@ -22,13 +35,79 @@ VIDEO_GENERATORS: List[Tuple[str, Callable, str, float]] = [
     ), "image", 0.167)
 ]
 
-def choose_video_generator(for_image: bool = False) -> Tuple[str, Callable]:
+# Хеджирование: если движок не успел к своему p75, та же задача отправляется второму движку,
+# берётся первый готовый результат. Сколько таких дублей разрешено на один цикл генерации.
+HEDGE_BUDGET_PER_CYCLE = int(os.getenv("HEDGE_BUDGET_PER_CYCLE", 2))
+HEDGE_QUANTILE = 0.75
+
+_hedge_lock = threading.Lock()
+_hedges_left = HEDGE_BUDGET_PER_CYCLE
+
+# Провайдер и API-хост каждого движка. Движок пропускается, пока разомкнута
+# цепь его провайдера или хоста (см. utils/circuit_breaker.py, utils/http.py):
+# Veo, Runway и Midjourney идут через kie.ai и отключаются вместе.
+ENGINE_CIRCUITS = {
+    "Veo 3 AI": ("veo3", "api.kie.ai"),
+    "Luma AI": ("luma", "api.lumalabs.ai"),
+    "Runway AI": ("runway", "api.kie.ai"),
+    "Midjourney AI": ("midjourney", "api.kie.ai"),
+}
+
+def _provider_breaker(name: str):
+    provider, _ = ENGINE_CIRCUITS[name]
+    # Исход пробной генерации известен только после её завершения
+    return get_breaker(f"provider:{provider}", probe_timeout=MAX_WAIT_TIME)
+
+def _is_available(name: str) -> bool:
+    if name not in ENGINE_CIRCUITS:
+        return True
+    _, host = ENGINE_CIRCUITS[name]
+    return get_breaker(f"host:{host}").available() and _provider_breaker(name).available()
+
+def _observed(name: str, func: Callable) -> Callable:
+    """Оборачивает запуск генерации, чтобы её время и исход попадали в статистику и цепь движка."""
+    breaker = _provider_breaker(name) if name in ENGINE_CIRCUITS else None
+
+    def _record(f):
+        if not breaker or f.cancelled():
+            return
+        if f.exception() is None:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def start(*args, **kwargs):
+        started_at = time.time()
+        try:
+            future = func(*args, **kwargs)
+        except (CircuitOpenError, RateLimitExceeded):
+            # Запрос не дошёл до провайдера (цепь разомкнута или исчерпан наш же бюджет ключа) —
+            # это не ошибка движка
+            raise
+        except Exception:
+            engine_stats.record_result(name, success=False)
+            if breaker:
+                breaker.record_failure()
+            raise
+        engine_stats.record_submit(name, time.time() - started_at)
+        engine_stats.observe(name, started_at, future)
+        future.add_done_callback(_record)
+        return future
+    return start
+
+
+def choose_video_generator(for_image: bool = False, exclude: Iterable[str] = ()) -> Tuple[str, Callable]:
     """
-    Возвращает (название, функция генерации видео) в зависимости от режима:
+    Возвращает (название, функция запуска генерации видео) в зависимости от режима:
     - for_image=True → только image-to-video генераторы
     - for_image=False → любые (text-to-video и image-to-video)
+    Движки из exclude и движки с разомкнутой цепью не выбираются.
     """
-    valid_generators = [(n, f, t, w) for n, f, t, w in VIDEO_GENERATORS if callable(f)]
+    excluded = set(exclude)
+    valid_generators = [
+        (n, f, t, w) for n, f, t, w in VIDEO_GENERATORS
+        if callable(f) and n not in excluded and _is_available(n)
+    ]
 
     if for_image:
         candidates = [(n, f, w) for n, f, t, w in valid_generators if t in {"image", "universal"}]
@@ -39,11 +118,123 @@ def choose_video_generator(for_image: bool = False) -> Tuple[str, Callable]:
         logger.error("❌ No compatible video generators found.")
         raise RuntimeError("No video generators available for the selected mode.")
 
-    names, funcs, weights = zip(*candidates)
+    names, funcs, base_weights = zip(*candidates)
+    factors = engine_stats.weight_factors(list(names))
+    weights = [w * factors[n] for n, w in zip(names, base_weights)]
     idx = random.choices(range(len(names)), weights=weights, k=1)[0]
-    name, func = names[idx], funcs[idx]
+    name, func = names[idx], _observed(names[idx], funcs[idx])
+    if name in ENGINE_CIRCUITS and not _provider_breaker(name).allow():
+        # Пробную попытку half-open цепи успел занять другой воркер
+        return choose_video_generator(for_image, excluded | {name})
 
     logger.info(f"Available generators for {'image' if for_image else 'text'}: {list(names)}")
+    logger.info("⚖️ Weights: " + ", ".join(f"{n}={w:.3f}" for n, w in zip(names, weights)))
     logger.info(f"🎲 Selected {'image-to-video' if for_image else 'text-to-video'} generator: {name}")
     return name, func
 
+
+
+def reset_hedge_budget() -> None:
+    """Новый цикл генерации — новый бюджет хеджей."""
+    global _hedges_left
+    with _hedge_lock:
+        _hedges_left = HEDGE_BUDGET_PER_CYCLE
+
+
+def _take_hedge() -> bool:
+    global _hedges_left
+    with _hedge_lock:
+        if _hedges_left <= 0:
+            return False
+        _hedges_left -= 1
+        return True
+
+
+def hedged(
+    name: str, func: Callable, for_image: bool, on_winner: Callable[[str], None], exclude: Iterable[str] = ()
+) -> Callable:
+    """
+    Оборачивает запуск генерации хеджем. Если движок `name` не закончил к своему
+    p75 (по накопленным замерам), та же задача отправляется другому движку
+    (не `name` и не из `exclude` — например, движки, чьё видео уже забраковано для этой задачи).
+    Побеждает первый готовый URL: on_winner(название движка) вызывается до того,
+    как итоговый Future получит результат, а проигравший Future отменяется
+    (poller перестаёт его опрашивать).
+    """
+    backup_exclude = [*exclude, name]
+
+    def start(*args, **kwargs) -> Future:
+        # Дубль запускается из потока таймера, а новые потоки не наследуют contextvars:
+        # без копии контекста provider_tasks не сохранит задачу дубля (нет resumable).
+        ctx = contextvars.copy_context()
+        primary = func(*args, **kwargs)
+        delay = latency_stats.quantile(engine_stats.engine_key(name), HEDGE_QUANTILE)
+        if delay is None:
+            return primary
+
+        result: Future = Future()
+        lock = threading.Lock()
+        running: dict[str, Future] = {name: primary}
+        state = {"hedging": False, "winner": None, "error": None}
+
+        def _fail_if_nothing_left() -> None:
+            # вызывается под lock
+            if not running and not state["hedging"] and state["winner"] is None and not result.done():
+                result.set_exception(state["error"])
+
+        def _settle(engine: str, f: Future) -> None:
+            with lock:
+                if f.cancelled() or state["winner"] is not None:
+                    return
+                running.pop(engine, None)
+                error = f.exception()
+                if error is not None:
+                    state["error"] = state["error"] or error
+                    _fail_if_nothing_left()
+                    return
+                state["winner"] = engine
+                losers = list(running.items())
+                running.clear()
+            for loser_name, loser in losers:
+                logger.info(f"🏁 {engine} finished first, abandoning {loser_name}")
+                loser.cancel()
+            try:
+                on_winner(engine)
+            except Exception as e:
+                result.set_exception(e)
+                return
+            result.set_result(f.result())
+
+        def _hedge() -> None:
+            with lock:
+                if state["winner"] is not None or not running or not _take_hedge():
+                    return
+                state["hedging"] = True
+            try:
+                backup_name, backup_func = choose_video_generator(for_image=for_image, exclude=backup_exclude)
+                backup = backup_func(*args, **kwargs)
+            except Exception as e:
+                logger.warning(f"⚠️ Hedge for {name} could not be started: {e}")
+                with lock:
+                    state["hedging"] = False
+                    _fail_if_nothing_left()
+                return
+            logger.info(f"🪝 {name} is past its p75 ({delay:.0f}s), hedging with {backup_name}")
+            with lock:
+                state["hedging"] = False
+                late = state["winner"] is not None
+                if not late:
+                    running[backup_name] = backup
+            if late:
+                backup.cancel()
+                return
+            backup.add_done_callback(lambda f: _settle(backup_name, f))
+
+        timer = threading.Timer(delay, ctx.run, args=(_hedge,))
+        timer.daemon = True
+        timer.start()
+        primary.add_done_callback(lambda f: _settle(name, f))
+        result.add_done_callback(lambda f: timer.cancel())
+        return result
+
+    return start
@@ -0,0 +1,99 @@
+import os
+
+import cv2
+import numpy as np
+
+from utils.logger import setup_logger
+
+logger = setup_logger("CoverSelector")
+
+# Вместо одного кадра на 1-й секунде (часто смазанного, тёмного или посреди перехода)
+# берём несколько кандидатов из первых COVER_WINDOW_SECONDS видео, оцениваем их уменьшенные
+# копии и сохраняем лучший. Кадры собирает проход video_qc, который и так декодирует всё видео.
+COVER_WINDOW_SECONDS = float(os.getenv("COVER_WINDOW_SECONDS", 3.0))
+CANDIDATES_PER_SECOND = float(os.getenv("COVER_CANDIDATES_PER_SECOND", 4))
+SCORE_WIDTH = 160               # ширина копии, на которой считаются метрики
+BLACK_LEVEL = 0.06              # средняя яркость ниже — кадр считается чёрным
+DUPLICATE_THRESHOLD = 0.01      # средняя разница яркости ниже — кадр повторяет предыдущего кандидата
+SHARPNESS_WEIGHT = 0.5
+EXPOSURE_WEIGHT = 0.3
+COLORFULNESS_WEIGHT = 0.2
+
+
+def candidate_stride(fps: float) -> int:
+    """Каждый какой кадр брать кандидатом."""
+    return max(1, round(fps / CANDIDATES_PER_SECOND))
+
+
+def thumbnail(frame: np.ndarray) -> np.ndarray:
+    """Уменьшенная копия кадра шириной SCORE_WIDTH для оценки."""
+    height, width = frame.shape[:2]
+    size = (SCORE_WIDTH, max(1, round(height * SCORE_WIDTH / width)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def score_candidates(thumbs: np.ndarray) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Оценки кадров (N,) по стопке уменьшенных BGR-копий (N, H, W, 3), все метрики сразу по всей стопке.
+    Чёрные кадры и повторы более раннего кандидата получают -inf.
+    """
+    pixels = thumbs.astype(np.float32) / 255.0
+    blue, green, red = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    gray = 0.114 * blue + 0.587 * green + 0.299 * red
+
+    # Резкость: дисперсия лапласиана
+    laplacian = (
+        gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+        - 4 * gray[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.reshape(len(gray), -1).var(axis=1)
+
+    # Экспозиция: средняя яркость ближе к середине и мало пересвеченных/провалившихся пикселей
+    brightness = gray.reshape(len(gray), -1).mean(axis=1)
+    clipped = ((gray < 0.02) | (gray > 0.98)).reshape(len(gray), -1).mean(axis=1)
+    exposure = np.clip(1 - 2 * np.abs(brightness - 0.45) - clipped, 0, 1)
+
+    # Насыщенность цвета (Hasler & Süsstrunk)
+    rg = (red - green).reshape(len(gray), -1)
+    yb = (0.5 * (red + green) - blue).reshape(len(gray), -1)
+    colorfulness = (
+        np.sqrt(rg.std(axis=1) ** 2 + yb.std(axis=1) ** 2)
+        + 0.3 * np.sqrt(rg.mean(axis=1) ** 2 + yb.mean(axis=1) ** 2)
+    )
+
+    # Повтор: почти не отличается от любого более раннего кандидата
+    small = gray[:, ::4, ::4].reshape(len(gray), -1)
+    difference = np.abs(small[:, None, :] - small[None, :, :]).mean(axis=2)
+    duplicate = np.tril(difference < DUPLICATE_THRESHOLD, k=-1).any(axis=1)
+    black = brightness < BLACK_LEVEL
+
+    scores = (
+        SHARPNESS_WEIGHT * sharpness / max(float(sharpness.max()), 1e-6)
+        + EXPOSURE_WEIGHT * exposure
+        + COLORFULNESS_WEIGHT * colorfulness / max(float(colorfulness.max()), 1e-6)
+    )
+    scores = np.where(black | duplicate, -np.inf, scores)
+    metrics = {"sharpness": sharpness, "brightness": brightness, "black": black, "duplicate": duplicate}
+    return scores, metrics
+
+
+def pick_best(frames: list[np.ndarray], thumbs: list[np.ndarray], times: list[float]) -> tuple[np.ndarray, dict]:
+    """Лучший кадр-кандидат (в полном разрешении) и сведения о выборе."""
+    scores, metrics = score_candidates(np.stack(thumbs))
+    if np.isneginf(scores).all():
+        # Все кандидаты чёрные или одинаковые — берём самый светлый
+        best = int(np.argmax(metrics["brightness"]))
+    else:
+        best = int(np.argmax(scores))
+
+    info = {
+        "time": round(times[best], 2),
+        "score": float(scores[best]),
+        "candidates": len(frames),
+        "rejected": int(np.isneginf(scores).sum()),
+    }
+    logger.info(
+        f"🖼️ Cover frame at {info['time']:.2f}s (score {info['score']:.2f}, "
+        f"{info['candidates']} candidates, {info['rejected']} black/duplicate)"
+    )
+    return frames[best], info
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+
+from services import latency_stats
+
+# Вес последнего замера в скользящем среднем (EWMA)
+EWMA_ALPHA = 0.2
+# Пока замеров меньше, вес движка не меняется
+MIN_OBSERVATIONS = 3
+# Границы, в которых может меняться статический вес движка
+MIN_WEIGHT_FACTOR = float(os.getenv("ROUTER_MIN_WEIGHT_FACTOR", 0.1))
+MAX_WEIGHT_FACTOR = float(os.getenv("ROUTER_MAX_WEIGHT_FACTOR", 2.0))
+
+
+@dataclass
+class EngineHealth:
+    latency: Optional[float] = None        # EWMA от отправки до готового видео, сек
+    submit_time: Optional[float] = None    # EWMA времени ответа на отправку задачи, сек
+    failure_rate: float = 0.0              # EWMA доли неудачных генераций
+    rejection_rate: float = 0.0            # EWMA доли готовых видео, забракованных проверкой качества
+    observations: int = 0
+
+
+_lock = threading.Lock()
+_health: dict[str, EngineHealth] = {}
+
+
+def _ewma(current: Optional[float], value: float) -> float:
+    return value if current is None else current + EWMA_ALPHA * (value - current)
+
+
+def _get(engine: str) -> EngineHealth:
+    return _health.setdefault(engine, EngineHealth())
+
+
+def record_submit(engine: str, seconds: float) -> None:
+    with _lock:
+        health = _get(engine)
+        health.submit_time = _ewma(health.submit_time, seconds)
+
+
+def record_result(engine: str, success: bool, latency: Optional[float] = None) -> None:
+    with _lock:
+        health = _get(engine)
+        health.failure_rate = _ewma(health.failure_rate, 0.0 if success else 1.0)
+        if success and latency is not None:
+            health.latency = _ewma(health.latency, latency)
+        health.observations += 1
+
+
+def record_qc(engine: str, passed: bool) -> None:
+    """
+    Вердикт проверки качества готового видео. Отдельный исход: генерация уже учтена
+    в record_result как успешная, здесь — только годится ли её результат.
+    """
+    with _lock:
+        health = _get(engine)
+        health.rejection_rate = _ewma(health.rejection_rate, 0.0 if passed else 1.0)
+
+
+def observe(engine: str, started_at: float, future: Future) -> None:
+    """Учитывает результат генерации, когда future завершится."""
+    def _done(f: Future) -> None:
+        if f.cancelled():
+            return
+        success = f.exception() is None
+        latency = time.time() - started_at if success else None
+        record_result(engine, success, latency)
+        if success:
+            # Распределение нужно для хеджирования (p75 движка)
+            latency_stats.record(engine_key(engine), latency)
+
+    future.add_done_callback(_done)
+
+
+def engine_key(engine: str) -> str:
+    """Ключ замеров времени генерации движка в latency_stats."""
+    return f"engine:{engine}"
+
+
+def snapshot() -> dict[str, EngineHealth]:
+    with _lock:
+        return {name: EngineHealth(**vars(health)) for name, health in _health.items()}
+
+
+def weight_factors(engines: list[str]) -> dict[str, float]:
+    """
+    Множитель к статическому весу каждого движка:
+    медленнее остальных, чаще падает или чаще выдаёт брак — множитель меньше, и наоборот.
+    """
+    health = snapshot()
+    totals = {}
+    for name in engines:
+        h = health.get(name)
+        if h and h.observations >= MIN_OBSERVATIONS and h.latency is not None:
+            totals[name] = h.latency + (h.submit_time or 0.0)
+
+    reference = sorted(totals.values())[len(totals) // 2] if totals else None
+
+    factors = {}
+    for name in engines:
+        h = health.get(name)
+        if not h or h.observations < MIN_OBSERVATIONS:
+            factors[name] = 1.0
+            continue
+        factor = ((1.0 - h.failure_rate) * (1.0 - h.rejection_rate)) ** 2
+        if reference and name in totals:
+            factor *= reference / totals[name]
+        factors[name] = min(MAX_WEIGHT_FACTOR, max(MIN_WEIGHT_FACTOR, factor))
+    return factors
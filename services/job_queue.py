@@ -0,0 +1,165 @@
+import importlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from utils.db import transaction
+from utils.logger import setup_logger
+
+logger = setup_logger("JobQueue")
+
+# Сколько секунд задача считается занятой воркером. Если воркер не подтвердил
+# выполнение за это время (процесс упал), задача снова становится доступной.
+VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", 15 * 60))
+# Задача, которая столько раз роняла процесс, больше не выдаётся
+MAX_DELIVERIES = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL DEFAULT 'default',
+    func TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    deliveries INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+@dataclass
+class LeasedJob:
+    id: int
+    func: Callable[..., Any]
+    args: tuple
+    deliveries: int
+
+
+def _init() -> None:
+    with transaction() as conn:
+        conn.execute(_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue_available ON jobs (queue, status, available_at)")
+
+
+def func_ref(func: Callable[..., Any]) -> Optional[str]:
+    """Ссылка вида 'module:qualname' или None, если функцию нельзя импортировать заново."""
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None)
+    if not module or not qualname or "<" in qualname:
+        return None
+    return f"{module}:{qualname}"
+
+
+def resolve_ref(ref: str) -> Callable[..., Any]:
+    module_name, qualname = ref.split(":", 1)
+    obj: Any = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def encode_value(value: Any) -> Any:
+    if callable(value):
+        ref = func_ref(value)
+        if ref is None:
+            raise TypeError(f"Callable {value!r} cannot be persisted")
+        return {"__callable__": ref}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode_value(v) for k, v in value.items()}
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {"__callable__"}:
+            return resolve_ref(value["__callable__"])
+        return {k: decode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    return value
+
+
+def put(func: Callable[..., Any], args: tuple, queue: str = "default", delay: float = 0) -> int:
+    """Сохраняет задачу на диск. Аргументы должны сериализоваться в JSON."""
+    ref = func_ref(func)
+    if ref is None:
+        raise TypeError(f"Task function {func!r} is not importable (lambda or closure)")
+    payload = json.dumps(encode_value(list(args)))
+    now = time.time()
+    with transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO jobs (queue, func, args, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (queue, ref, payload, now + delay, now)
+        )
+        return cursor.lastrowid
+
+
+def lease(queue: str = "default") -> Optional[LeasedJob]:
+    """
+    Выдаёт следующую доступную задачу очереди `queue` и блокирует её на VISIBILITY_TIMEOUT.
+    Задачи с истёкшей арендой выдаются повторно (at-least-once).
+    """
+    while True:
+        now = time.time()
+        with transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT id, func, args, deliveries FROM jobs
+                WHERE queue = ?
+                  AND ((status = 'queued' AND available_at <= ?)
+                    OR (status = 'leased' AND lease_until <= ?))
+                ORDER BY available_at, id
+                LIMIT 1
+                """,
+                (queue, now, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row["deliveries"] >= MAX_DELIVERIES:
+                logger.error(f"☠️ Job {row['id']} ({row['func']}) exceeded {MAX_DELIVERIES} deliveries. Dropping.")
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+                continue
+
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_until = ?, deliveries = deliveries + 1 WHERE id = ?",
+                (now + VISIBILITY_TIMEOUT, row["id"])
+            )
+
+        try:
+            func = resolve_ref(row["func"])
+            args = tuple(decode_value(json.loads(row["args"])))
+        except Exception as e:
+            logger.error(f"❌ Cannot load job {row['id']} ({row['func']}): {e}. Dropping.")
+            ack(row["id"])
+            continue
+
+        return LeasedJob(row["id"], func, args, row["deliveries"] + 1)
+
+
+def ack(job_id: int) -> None:
+    with transaction() as conn:
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+def release_all_leases() -> int:
+    """При старте процесса чужих воркеров нет — все аренды можно вернуть в очередь сразу."""
+    with transaction() as conn:
+        cursor = conn.execute("UPDATE jobs SET status = 'queued', lease_until = NULL WHERE status = 'leased'")
+        return cursor.rowcount
+
+
+def size(queue: Optional[str] = None) -> int:
+    with transaction() as conn:
+        if queue is None:
+            return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM jobs WHERE queue = ?", (queue,)).fetchone()[0]
+
+
+_init()
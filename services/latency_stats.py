@@ -0,0 +1,106 @@
+import threading
+import time
+from typing import Optional
+
+from utils.db import transaction
+from utils.logger import setup_logger
+
+logger = setup_logger("LatencyStats")
+
+# Сколько последних замеров хранится на каждый ключ провайдер/модель
+WINDOW_SIZE = 200
+# Пока замеров меньше, опрос идёт с фиксированным интервалом
+MIN_SAMPLES = 5
+# Самый частый опрос вокруг ожидаемого завершения (сек)
+MIN_DENSE_INTERVAL = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completion_times (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_samples: dict[str, list[float]] = {}
+
+
+def _init() -> None:
+    with transaction() as conn:
+        conn.execute(_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS completion_times_key ON completion_times (key, id)")
+
+
+def _load(key: str) -> list[float]:
+    with _lock:
+        if key in _samples:
+            return _samples[key]
+    with transaction() as conn:
+        rows = conn.execute(
+            "SELECT seconds FROM completion_times WHERE key = ? ORDER BY id DESC LIMIT ?",
+            (key, WINDOW_SIZE)
+        ).fetchall()
+    with _lock:
+        return _samples.setdefault(key, [row["seconds"] for row in reversed(rows)])
+
+
+def record(key: str, seconds: float) -> None:
+    """Сохраняет время от отправки задачи до её завершения."""
+    samples = _load(key)
+    with _lock:
+        samples.append(seconds)
+        del samples[:-WINDOW_SIZE]
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO completion_times (key, seconds, created_at) VALUES (?, ?, ?)",
+            (key, seconds, time.time())
+        )
+        conn.execute(
+            """
+            DELETE FROM completion_times WHERE key = ? AND id NOT IN (
+                SELECT id FROM completion_times WHERE key = ? ORDER BY id DESC LIMIT ?
+            )
+            """,
+            (key, key, WINDOW_SIZE)
+        )
+
+
+def quantile(key: str, q: float) -> Optional[float]:
+    samples = _load(key)
+    with _lock:
+        if len(samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def first_poll_delay(key: str, default: float) -> float:
+    """Первый опрос — незадолго до медианы (но не раньше p25), а не через фиксированные 30 секунд."""
+    p25 = quantile(key, 0.25)
+    p50 = quantile(key, 0.5)
+    if p25 is None or p50 is None:
+        return default
+    return max(MIN_DENSE_INTERVAL, p25, p50 * 0.8)
+
+
+def next_poll_delay(key: str, elapsed: float, default: float) -> float:
+    """
+    Следующая пауза опроса с учётом распределения времени генерации:
+    до p90 опрашиваем часто (шаг зависит от разброса), после — с обычным интервалом,
+    чтобы хвост долгих генераций не стоил лишних запросов.
+    """
+    p50 = quantile(key, 0.5)
+    p90 = quantile(key, 0.9)
+    if p50 is None or p90 is None:
+        return default
+
+    if elapsed < p90:
+        dense = max(MIN_DENSE_INTERVAL, min(default, (p90 - p50) / 4))
+        return min(dense, max(MIN_DENSE_INTERVAL, p90 - elapsed))
+    return default
+
+
+_init()
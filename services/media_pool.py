@@ -0,0 +1,53 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("MediaPool")
+
+# Декодирование видео и кодирование картинок (OpenCV) выполняются в отдельных процессах:
+# они грузят CPU и не должны отнимать GIL у потоков оркестрации (очередь, поллер, HTTP).
+# Задача получает пути к файлам и возвращает небольшой словарь с результатом —
+# кадры и байты между процессами не передаются.
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", min(2, os.cpu_count() or 1)))
+MEDIA_TASK_TIMEOUT = float(os.getenv("MEDIA_TASK_TIMEOUT", 300))
+
+_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn, а не fork: процесс многопоточный, и форк мог бы унести чужие захваченные блокировки
+            _executor = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"🧵 Started media process pool ({MEDIA_WORKERS} worker(s))")
+        return _executor
+
+
+def _reset(broken: ProcessPoolExecutor) -> None:
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def run(func: Callable[..., Any], *args: Any, timeout: float = MEDIA_TASK_TIMEOUT) -> Any:
+    """
+    Выполняет func(*args) в процессе пула и ждёт результат.
+    func должна импортироваться на уровне модуля, а аргументы и результат — сериализоваться (pickle).
+    """
+    executor = _get_executor()
+    try:
+        return executor.submit(func, *args).result(timeout=timeout)
+    except BrokenProcessPool:
+        # Процесс упал (например, OpenCV на битом файле) — следующие задачи получат новый пул
+        logger.error(f"❌ Media worker crashed while running {func.__name__}, restarting the pool")
+        _reset(executor)
+        raise
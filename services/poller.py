@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from services import latency_stats, provider_tasks
+from utils.logger import setup_logger
+
+logger = setup_logger("Poller")
+
+POLL_INTERVAL = 30          # пауза между опросами статуса (сек)
+MAX_WAIT_TIME = 600         # максимум 10 минут ожидания одной задачи
+MAX_CONCURRENT_POLLS = 20   # сколько HTTP-запросов статуса может идти одновременно
+# Если провайдер присылает webhook, опрос остаётся только страховкой и постепенно редеет
+POLL_BACKOFF = 1.5
+MAX_FALLBACK_INTERVAL = 120
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+@dataclass
+class PollResult:
+    """Результат одного опроса статуса задачи у провайдера."""
+    status: str
+    result: Any = None
+    error: Optional[str] = None
+
+
+@dataclass
+class _TrackedJob:
+    provider: str
+    task_id: str
+    check: Callable[[str], PollResult]
+    future: Future
+    interval: float
+    deadline: Optional[float]
+    callbacks: bool
+    wake: asyncio.Event
+    stats_key: str
+    submitted_at: float
+    learn: bool
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_poll_semaphore: Optional[asyncio.Semaphore] = None
+_in_flight: dict[tuple[str, str], _TrackedJob] = {}
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _poll_semaphore
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _poll_semaphore = asyncio.Semaphore(MAX_CONCURRENT_POLLS)
+            thread = threading.Thread(target=_run_loop, args=(_loop,), name="poller-loop", daemon=True)
+            thread.start()
+            logger.info("🔄 Poller event loop started.")
+    return _loop
+
+
+def _resolve(future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+async def _sleep_or_wake(job: _TrackedJob, delay: float) -> None:
+    try:
+        await asyncio.wait_for(job.wake.wait(), timeout=delay)
+        logger.info(f"📬 [{job.provider}] Callback received for {job.task_id}, polling now.")
+    except asyncio.TimeoutError:
+        pass
+    job.wake.clear()
+
+
+async def _watch(job: _TrackedJob, first_delay: float) -> None:
+    key = (job.provider, job.task_id)
+    interval = job.interval
+    try:
+        await _sleep_or_wake(job, first_delay)
+        while not job.future.done():
+            if job.deadline is not None and time.time() > job.deadline:
+                raise TimeoutError(f"{job.provider} task {job.task_id} timed out")
+
+            async with _poll_semaphore:
+                try:
+                    poll = await asyncio.to_thread(job.check, job.task_id)
+                except Exception as e:
+                    logger.warning(f"⚠️ [{job.provider}] Polling {job.task_id} failed, retrying: {e}")
+                    poll = PollResult(PENDING)
+
+            if poll.status == COMPLETED:
+                elapsed = time.time() - job.submitted_at
+                logger.info(f"✅ [{job.provider}] Task {job.task_id} completed in ~{elapsed:.0f}s.")
+                if job.learn:
+                    await asyncio.to_thread(latency_stats.record, job.stats_key, elapsed)
+                # Колбэки future выполняются вне event loop, чтобы не блокировать опрос остальных задач
+                await asyncio.to_thread(_resolve, job.future, poll.result)
+                return
+            if poll.status == FAILED:
+                raise Exception(f"{job.provider} task {job.task_id} failed: {poll.error or 'Unknown error'}")
+
+            logger.info(f"⏳ [{job.provider}] Task {job.task_id} still processing...")
+            if job.callbacks:
+                await _sleep_or_wake(job, interval)
+                interval = min(interval * POLL_BACKOFF, max(MAX_FALLBACK_INTERVAL, job.interval))
+            else:
+                elapsed = time.time() - job.submitted_at
+                await _sleep_or_wake(job, latency_stats.next_poll_delay(job.stats_key, elapsed, job.interval))
+    except Exception as e:
+        logger.error(f"❌ [{job.provider}] {e}")
+        await asyncio.to_thread(_resolve, job.future, None, e)
+    finally:
+        _in_flight.pop(key, None)
+        if job.future.done():
+            await asyncio.to_thread(provider_tasks.forget, job.provider, job.task_id)
+
+
+def track(
+    provider: str,
+    task_id: str,
+    check: Callable[[str], PollResult],
+    interval: float = POLL_INTERVAL,
+    max_wait: Optional[float] = MAX_WAIT_TIME,
+    first_delay: Optional[float] = None,
+    resume_with: Optional[tuple[Callable[..., Any], tuple]] = None,
+    callbacks: bool = False,
+    model: Optional[str] = None
+) -> Future:
+    """
+    Ставит задачу провайдера на отслеживание и сразу возвращает Future.
+
+    Все задачи опрашиваются одним event loop в отдельном потоке, поэтому
+    ожидание генерации не занимает рабочие потоки task_manager.
+    `check` — блокирующая функция одного опроса, она вызывается в пуле потоков.
+
+    Если задача запущена внутри provider_tasks.resumable(...), её taskId сохраняется
+    в базу. После перезапуска она будет снова поставлена на опрос через
+    `resume_with` = (func, args) — func(task_id, *args) -> Future — или, по умолчанию,
+    через тот же `check`.
+
+    `callbacks=True` означает, что провайдер пришлёт webhook (см. notify):
+    тогда опрос остаётся запасным вариантом и его интервал растёт.
+
+    Без webhook расписание опроса строится по накопленному распределению времени
+    генерации для пары провайдер/`model` (см. latency_stats): первый опрос — около
+    медианы, дальше чаще до p90. Явно заданный `first_delay` (восстановление после
+    перезапуска) отключает и расчёт первого опроса, и запись замера.
+    """
+    loop = _ensure_loop()
+    key = (provider, task_id)
+    existing = _in_flight.get(key)
+    if existing is not None:
+        return existing.future
+
+    future: Future = Future()
+    now = time.time()
+    deadline = now + max_wait if max_wait is not None else None
+    stats_key = f"{provider}:{model}" if model else provider
+    job = _TrackedJob(
+        provider, task_id, check, future, interval, deadline, callbacks, asyncio.Event(),
+        stats_key, now, learn=first_delay is None
+    )
+    _in_flight[key] = job
+    provider_tasks.record(provider, task_id, check, resume_with)
+
+    if first_delay is not None:
+        delay = first_delay
+    elif callbacks:
+        delay = interval
+    else:
+        delay = latency_stats.first_poll_delay(stats_key, interval)
+    asyncio.run_coroutine_threadsafe(_watch(job, delay), loop)
+    logger.info(f"🕒 [{provider}] Tracking taskId={task_id} (in flight: {len(_in_flight)})")
+    return future
+
+
+def notify(provider: str, task_id: str) -> bool:
+    """
+    Провайдер сообщил о завершении задачи: опрашиваем её немедленно, не дожидаясь интервала.
+    Итоговый статус всё равно берётся из API провайдера через `check`.
+    """
+    job = _in_flight.get((provider, task_id))
+    if job is None or _loop is None:
+        return False
+    _loop.call_soon_threadsafe(job.wake.set)
+    return True
+
+
+def in_flight_count() -> int:
+    return len(_in_flight)
+
+
+def then(
+    future: Future,
+    on_result: Callable[[Any], Any],
+    on_error: Optional[Callable[[BaseException], Any]] = None
+) -> Future:
+    """
+    Цепочка поверх Future: вызывает `on_result` с результатом (или `on_error` с ошибкой).
+    Если обработчик вернул Future, итоговый Future завершится вместе с ним.
+    """
+    out: Future = Future()
+    # Обработчики выполняются в контексте вызывающего, чтобы следующие задачи
+    # провайдера сохранялись с тем же продолжением пайплайна
+    context = contextvars.copy_context()
+
+    def _forward(inner: Future) -> None:
+        if inner.cancelled():
+            out.cancel()
+        elif inner.exception() is not None:
+            _resolve(out, error=inner.exception())
+        else:
+            _resolve(out, inner.result())
+
+    def _done(source: Future) -> None:
+        try:
+            if source.cancelled():
+                out.cancel()
+                return
+            error = source.exception()
+            if error is not None:
+                if on_error is None:
+                    _resolve(out, error=error)
+                    return
+                value = context.run(on_error, error)
+            else:
+                value = context.run(on_result, source.result())
+        except Exception as e:
+            _resolve(out, error=e)
+            return
+
+        if isinstance(value, Future):
+            value.add_done_callback(_forward)
+        else:
+            _resolve(out, value)
+
+    future.add_done_callback(_done)
+    # Отмена итогового Future (например, проигравший хедж) останавливает и исходную задачу
+    out.add_done_callback(lambda f: future.cancel() if f.cancelled() else None)
+    return out
@@ -0,0 +1,87 @@
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+from utils import llm
+from utils.db import DB_PATH
+from utils.logger import setup_logger
+
+logger = setup_logger("PromptDedup")
+
+# Эмбеддинги последних принятых промптов: новый промпт, слишком похожий на любой
+# из них, отбрасывается до того, как за него заплатят Midjourney и видеодвижок.
+SIMILARITY_THRESHOLD = float(os.getenv("PROMPT_SIMILARITY_THRESHOLD", 0.92))
+# Сколько последних промптов помнит индекс
+WINDOW_SIZE = int(os.getenv("PROMPT_INDEX_WINDOW", 2000))
+INDEX_PATH = os.getenv("PROMPT_INDEX_PATH", os.path.join(os.path.dirname(DB_PATH), "prompt_index.npy"))
+
+_lock = threading.Lock()
+_matrix: Optional[np.ndarray] = None   # (N, D) float32, строки нормированы
+
+
+def _load() -> Optional[np.ndarray]:
+    global _matrix
+    if _matrix is None and os.path.exists(INDEX_PATH):
+        try:
+            _matrix = np.load(INDEX_PATH)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Could not read prompt index {INDEX_PATH}, starting empty: {e}")
+    return _matrix
+
+
+def _save(matrix: np.ndarray) -> None:
+    directory = os.path.dirname(INDEX_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{INDEX_PATH}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def _normalize(vectors: list[list[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def filter_new(prompts: list[str]) -> list[str]:
+    """
+    Возвращает промпты, не похожие (cosine < SIMILARITY_THRESHOLD) ни на недавние,
+    ни друг на друга, и запоминает их в индексе. Если эмбеддинги недоступны,
+    пропускает всё как есть — дедупликация не должна останавливать генерацию.
+    """
+    global _matrix
+    if not prompts:
+        return []
+    try:
+        vectors = _normalize(llm.embed("prompt_dedup", prompts))
+    except Exception as e:
+        logger.warning(f"⚠️ Embeddings unavailable, skipping duplicate check: {e}")
+        return prompts
+
+    with _lock:
+        index = _load()
+        if index is not None and index.shape[1] != vectors.shape[1]:
+            logger.warning("⚠️ Embedding size changed, resetting prompt index")
+            index = None
+
+        accepted, accepted_vectors = [], []
+        for prompt, vector in zip(prompts, vectors):
+            seen = [m for m in (index, np.asarray(accepted_vectors, dtype=np.float32)) if m is not None and len(m)]
+            similarity = max((float(np.max(m @ vector)) for m in seen), default=0.0)
+            if similarity >= SIMILARITY_THRESHOLD:
+                logger.info(f"♻️ Dropping near-duplicate prompt (similarity {similarity:.2f}): {prompt[:80]}")
+                continue
+            accepted.append(prompt)
+            accepted_vectors.append(vector)
+
+        if accepted_vectors:
+            new_rows = np.asarray(accepted_vectors, dtype=np.float32)
+            index = new_rows if index is None else np.vstack([index, new_rows])
+            index = index[-WINDOW_SIZE:]
+            _save(index)
+            _matrix = index
+    return accepted
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from prompt.text_image_video_prompt import generate_image_prompts, generate_portrait_prompts
+from prompt.text_to_video_prompt import generate_prompts
+from services import prompt_dedup
+from services.task_manager import enqueue_task
+from utils.db import transaction
+from utils.logger import setup_logger
+
+logger = setup_logger("PromptPool")
+
+# Запас готовых промптов на каждый тип пайплайна: задача берёт промпт из пула
+# мгновенно, а фоновая задача в пуле воркеров "llm" догенерирует новые.
+POOL_SIZE = int(os.getenv("PROMPT_POOL_SIZE", 10))
+# Ниже этого уровня пул пополняется до POOL_SIZE
+LOW_WATER_MARK = int(os.getenv("PROMPT_POOL_LOW_WATER", 4))
+# Сколько идей запрашивается у GPT одним вызовом (инструкция оплачивается один раз на пачку)
+BATCH_SIZE = int(os.getenv("PROMPT_BATCH_SIZE", 5))
+# Сколько пачек подряд можно перегенерировать, если почти всё в них — повторы
+MAX_GENERATION_ROUNDS = 3
+
+# Пакетные генераторы: n -> список из не более чем n промптов
+GENERATORS: dict[str, Callable[[int], list[str]]] = {
+    "text-to-video": generate_prompts,
+    "portrait-to-video": generate_portrait_prompts,
+    "image-to-video": generate_image_prompts,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompt_pool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+_refilling: set[str] = set()
+_refilling_lock = threading.Lock()
+
+
+def _init() -> None:
+    with transaction() as conn:
+        conn.execute(_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS prompt_pool_kind ON prompt_pool (kind, id)")
+
+
+def size(kind: str) -> int:
+    with transaction() as conn:
+        return conn.execute("SELECT COUNT(*) FROM prompt_pool WHERE kind = ?", (kind,)).fetchone()[0]
+
+
+def _pop(kind: str) -> Optional[str]:
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT id, prompt FROM prompt_pool WHERE kind = ? ORDER BY id LIMIT 1", (kind,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM prompt_pool WHERE id = ?", (row["id"],))
+    return row["prompt"]
+
+
+def _add(kind: str, prompts: list[str]) -> None:
+    now = time.time()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO prompt_pool (kind, prompt, created_at) VALUES (?, ?, ?)",
+            [(kind, prompt, now) for prompt in prompts]
+        )
+
+
+def _generate(kind: str, n: int) -> list[str]:
+    """Пачка новых промптов без почти-дубликатов недавних (см. prompt_dedup)."""
+    return prompt_dedup.filter_new(GENERATORS[kind](n))
+
+
+def top_up(kind: str) -> None:
+    """Догенерирует промпты, пока в пуле не станет POOL_SIZE. Выполняется в пуле "llm"."""
+    try:
+        missing = POOL_SIZE - size(kind)
+        if missing <= 0:
+            return
+        logger.info(f"🧺 Topping up '{kind}' prompt pool with {missing} prompt(s)")
+        max_rounds = MAX_GENERATION_ROUNDS * -(-missing // BATCH_SIZE)
+        for _ in range(max_rounds):
+            if missing <= 0:
+                break
+            prompts = _generate(kind, min(missing, BATCH_SIZE))
+            _add(kind, prompts)
+            missing -= len(prompts)
+    finally:
+        with _refilling_lock:
+            _refilling.discard(kind)
+
+
+def schedule_top_up(kind: str) -> None:
+    """Ставит пополнение в очередь, если пул опустился ниже LOW_WATER_MARK и пополнение ещё не идёт."""
+    with _refilling_lock:
+        if kind in _refilling or size(kind) >= LOW_WATER_MARK:
+            return
+        _refilling.add(kind)
+    enqueue_task(top_up, kind, queue="llm")
+
+
+def get_prompt(kind: str) -> str:
+    """Готовый промпт из пула или, если пул пуст, сгенерированный прямо сейчас."""
+    prompt = _pop(kind)
+    schedule_top_up(kind)
+    if prompt is None:
+        # Пул пуст: задача ждёт только одну идею, пул тем временем пополняет top_up в пуле "llm"
+        logger.warning(f"🫙 '{kind}' prompt pool is empty, generating inline")
+        for _ in range(MAX_GENERATION_ROUNDS):
+            prompts = _generate(kind, 1)
+            if prompts:
+                return prompts[0]
+        raise RuntimeError(f"Could not generate a non-duplicate '{kind}' prompt")
+    return prompt
+
+
+_init()
@@ -0,0 +1,128 @@
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from services.job_queue import func_ref, resolve_ref, encode_value, decode_value
+from utils.db import transaction
+from utils.logger import setup_logger
+
+logger = setup_logger("ProviderTasks")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS provider_tasks (
+    provider TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    check_func TEXT NOT NULL,
+    resume_func TEXT,
+    resume_args TEXT NOT NULL DEFAULT '[]',
+    continuation TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (provider, task_id)
+)
+"""
+
+# Продолжение пайплайна: (функция, аргументы). Функция вызывается как func(future, *args)
+# и должна сама довести результат до импорта — так же, как при обычном запуске.
+_continuation: contextvars.ContextVar[Optional[tuple[Callable[..., Any], tuple]]] = (
+    contextvars.ContextVar("provider_continuation", default=None)
+)
+
+
+def _init() -> None:
+    with transaction() as conn:
+        conn.execute(_SCHEMA)
+
+
+@contextmanager
+def resumable(on_complete: Callable[..., Any], *args: Any) -> Iterator[None]:
+    """
+    Все задачи провайдеров, запущенные внутри блока, сохраняются в базу вместе
+    с продолжением пайплайна, чтобы после перезапуска их можно было дождаться.
+    """
+    token = _continuation.set((on_complete, args))
+    try:
+        yield
+    finally:
+        _continuation.reset(token)
+
+
+def record(
+    provider: str,
+    task_id: str,
+    check: Callable[..., Any],
+    resume_with: Optional[tuple[Callable[..., Any], tuple]] = None
+) -> None:
+    continuation = _continuation.get()
+    if continuation is None:
+        return
+
+    on_complete, args = continuation
+    resume_func, resume_args = resume_with if resume_with else (None, ())
+    try:
+        row = (
+            provider,
+            task_id,
+            func_ref(check),
+            func_ref(resume_func) if resume_func else None,
+            json.dumps(encode_value(list(resume_args))),
+            json.dumps({"func": func_ref(on_complete), "args": encode_value(list(args))}),
+            time.time()
+        )
+    except TypeError as e:
+        logger.error(f"❌ Cannot persist {provider} task {task_id}: {e}")
+        return
+
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO provider_tasks
+                (provider, task_id, check_func, resume_func, resume_args, continuation, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            row
+        )
+
+
+def forget(provider: str, task_id: str) -> None:
+    with transaction() as conn:
+        conn.execute("DELETE FROM provider_tasks WHERE provider = ? AND task_id = ?", (provider, task_id))
+
+
+def resume_all() -> int:
+    """
+    Снова ставит на опрос задачи, которые были в работе у провайдеров при остановке процесса.
+    Результат передаётся в сохранённое продолжение пайплайна вместо повторной генерации.
+    """
+    from services import poller
+
+    with transaction() as conn:
+        rows = conn.execute("SELECT * FROM provider_tasks ORDER BY created_at").fetchall()
+
+    resumed = 0
+    for row in rows:
+        provider, task_id = row["provider"], row["task_id"]
+        try:
+            continuation = json.loads(row["continuation"])
+            on_complete = resolve_ref(continuation["func"])
+            args = tuple(decode_value(continuation["args"]))
+            check = resolve_ref(row["check_func"])
+            resume_args = tuple(decode_value(json.loads(row["resume_args"])))
+
+            with resumable(on_complete, *args):
+                if row["resume_func"]:
+                    future = resolve_ref(row["resume_func"])(task_id, *resume_args)
+                else:
+                    future = poller.track(provider, task_id, check, first_delay=0)
+            on_complete(future, *args)
+            resumed += 1
+            logger.info(f"♻️ Resumed {provider} task {task_id}")
+        except Exception as e:
+            logger.error(f"❌ Failed to resume {provider} task {task_id}: {e}", exc_info=True)
+            forget(provider, task_id)
+
+    return resumed
+
+
+_init()
@@ -1,41 +1,110 @@
-﻿import threading
-import queue
+﻿import os
+import threading
+import time
 from typing import Callable, Any
 from utils.logger import setup_logger
+from services import job_queue
 
 logger = setup_logger("TaskQueue")
 
-# Максимальный размер очереди задач
-QUEUE_MAX_SIZE = 10
-_task_queue: "queue.Queue[tuple[Callable[..., Any], tuple[Any, ...]]]" = queue.Queue(maxsize=QUEUE_MAX_SIZE)
+# Задачи хранятся в SQLite (services/job_queue.py) и переживают перезапуск контейнера.
+# Если воркер не успел подтвердить задачу, после истечения аренды она выполнится повторно.
 
-# Максимальное количество одновременно работающих потоков
-MAX_WORKERS = 3
+# Пулы воркеров по этапам пайплайна: имя -> (кол-во потоков, размер очереди).
+# Медленные этапы не отнимают потоки у быстрых. Значения можно переопределить
+# переменными окружения POOL_<ИМЯ>_WORKERS и POOL_<ИМЯ>_QUEUE_SIZE.
+WORKER_POOLS: dict[str, tuple[int, int]] = {
+    "default": (2, 100),   # точки входа пайплайнов и переходы между этапами
+    "llm": (4, 50),        # запросы к GPT: промпты, сценарии
+    "image": (2, 20),      # отправка задач в Midjourney
+    "video": (2, 20),      # отправка задач видеогенераторам
+    "frames": (2, 20),     # скачивание видео и извлечение обложки
+    "import": (2, 50),     # импорт готовых видео в SeemeeGo
+}
+# Сколько секунд enqueue_task ждёт места в заполненной очереди этапа.
+# После этого задача всё равно сохраняется — мы не теряем работу, только тормозим источник.
+ENQUEUE_BLOCK_TIMEOUT = 60
+# Как часто простаивающий воркер перепроверяет очередь (отложенные задачи, истёкшие аренды)
+IDLE_POLL_INTERVAL = 5
 
-def _worker_loop(worker_id: int):
+
+def _pool_setting(name: str, key: str, default: int) -> int:
+    return int(os.getenv(f"POOL_{name.upper()}_{key}", default))
+
+
+_pools: dict[str, tuple[int, int]] = {
+    name: (_pool_setting(name, "WORKERS", workers), _pool_setting(name, "QUEUE_SIZE", size))
+    for name, (workers, size) in WORKER_POOLS.items()
+}
+_new_task = {name: threading.Condition() for name in _pools}
+_task_done = {name: threading.Condition() for name in _pools}
+
+def _worker_loop(pool: str, worker_id: int):
     while True:
-        func, args = _task_queue.get()
-        func_name = getattr(func, "__name__", str(func))
         try:
-            logger.info(f"[worker-{worker_id}] Starting task: {func_name}")
-            func(*args)
+            job = job_queue.lease(pool)
+        except Exception as e:
+            logger.error(f"[{pool}-{worker_id}] Failed to read task queue: {e}", exc_info=True)
+            job = None
+
+        if job is None:
+            with _new_task[pool]:
+                _new_task[pool].wait(timeout=IDLE_POLL_INTERVAL)
+            continue
+
+        func_name = getattr(job.func, "__name__", str(job.func))
+        try:
+            if job.deliveries > 1:
+                logger.warning(f"[{pool}-{worker_id}] Redelivering task {func_name} (delivery {job.deliveries})")
+            logger.info(f"[{pool}-{worker_id}] Starting task: {func_name}")
+            job.func(*job.args)
         except Exception as e:
-            logger.error(f"[worker-{worker_id}] Error while executing {func_name}: {e}", exc_info=True)
+            logger.error(f"[{pool}-{worker_id}] Error while executing {func_name}: {e}", exc_info=True)
         finally:
-            _task_queue.task_done()
+            job_queue.ack(job.id)
+            with _task_done[pool]:
+                _task_done[pool].notify_all()
+
+# Возвращаем в очередь задачи, которые выполнялись в момент остановки процесса
+_released = job_queue.release_all_leases()
+if _released:
+    logger.info(f"♻️ Re-queued {_released} task(s) interrupted by restart.")
 
-# Запускаем пул воркеров
-for i in range(MAX_WORKERS):
-    thread = threading.Thread(target=_worker_loop, args=(i,), daemon=True)
-    thread.start()
+# Запускаем пулы воркеров
+for _pool, (_workers, _) in _pools.items():
+    for i in range(_workers):
+        thread = threading.Thread(target=_worker_loop, args=(_pool, i), name=f"{_pool}-{i}", daemon=True)
+        thread.start()
 
-def enqueue_task(func: Callable[..., Any], *args: Any) -> None:
+def _wait_for_room(queue: str) -> None:
+    _, max_size = _pools[queue]
+    deadline = time.time() + ENQUEUE_BLOCK_TIMEOUT
+    while job_queue.size(queue) >= max_size:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            logger.warning(f"⚠️ Queue '{queue}' is full (limit: {max_size}). Enqueueing over the limit.")
+            return
+        with _task_done[queue]:
+            _task_done[queue].wait(timeout=min(remaining, IDLE_POLL_INTERVAL))
+
+def enqueue_task(func: Callable[..., Any], *args: Any, queue: str = "default") -> None:
     if not callable(func):
         logger.error(f"❌ Cannot enqueue non-callable object: {func}")
         return
+    if queue not in _pools:
+        logger.error(f"❌ Unknown task queue '{queue}' for {getattr(func, '__name__', str(func))}")
+        return
+
+    # Воркер не должен ждать места в своей же очереди — иначе пул может заблокировать сам себя
+    if not threading.current_thread().name.startswith(f"{queue}-"):
+        _wait_for_room(queue)
 
     try:
-        _task_queue.put_nowait((func, args))
-        logger.debug(f"✅ Enqueued task: {getattr(func, '__name__', str(func))} with args: {args}")
-    except queue.Full:
-        logger.warning("⚠️ Task queue is full (limit: 10). Dropping task.")
+        job_queue.put(func, args, queue=queue)
+        logger.debug(f"✅ Enqueued task: {getattr(func, '__name__', str(func))} with args: {args} (queue: {queue})")
+    except TypeError as e:
+        logger.error(f"❌ Cannot persist task {getattr(func, '__name__', str(func))}: {e}")
+        return
+
+    with _new_task[queue]:
+        _new_task[queue].notify()
@@ -0,0 +1,130 @@
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from services import cover_selector
+from services.cover_selector import BLACK_LEVEL, COVER_WINDOW_SECONDS
+
+# Проверка готового видео перед импортом: обрезанные, чёрные, зависшие и не того формата ролики
+# отбраковываются, и задача уходит на другой движок. Кадры читаются один раз подряд,
+# с шагом и в маленьком разрешении — проверка дешёвая по сравнению с генерацией.
+# Тот же проход собирает кандидатов в обложку (см. cover_selector), чтобы не декодировать видео дважды.
+MIN_DURATION = float(os.getenv("QC_MIN_DURATION", 3.0))            # сек
+MIN_SIDE = int(os.getenv("QC_MIN_SIDE", 480))                      # px, меньшая сторона кадра
+MIN_FPS = float(os.getenv("QC_MIN_FPS", 15))
+ASPECT_TOLERANCE = float(os.getenv("QC_ASPECT_TOLERANCE", 0.05))   # допустимое отклонение пропорций
+MAX_BLACK_FRACTION = float(os.getenv("QC_MAX_BLACK_FRACTION", 0.5))
+MAX_FROZEN_SECONDS = float(os.getenv("QC_MAX_FROZEN_SECONDS", 2.0))
+MIN_MOTION = float(os.getenv("QC_MIN_MOTION", 0.003))              # средняя разница соседних выборок
+SAMPLES_PER_SECOND = 4
+SAMPLE_WIDTH = 64
+FROZEN_THRESHOLD = 0.002        # разница соседних выборок ниже — кадр не изменился
+DECODED_FRACTION = 0.9          # меньше этой доли заявленной длительности декодируется — файл обрезан
+
+
+def _parse_aspect(aspect_ratio: str) -> Optional[float]:
+    try:
+        width, height = (float(part) for part in aspect_ratio.split(":"))
+        return width / height
+    except (AttributeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _sample_frames(cap, stride: int, cover_stride: int, cover_last_frame: int):
+    """
+    Один проход по видео: уменьшенные серые кадры (N, H, W) — каждый stride-й,
+    число декодированных кадров и кандидаты в обложку (кадры, их копии, время в кадрах)
+    до cover_last_frame включительно с шагом cover_stride.
+    """
+    samples = []
+    candidates = ([], [], [])
+    decoded = 0
+    while cap.grab():
+        is_sample = decoded % stride == 0
+        is_candidate = decoded <= cover_last_frame and decoded % cover_stride == 0
+        if is_sample or is_candidate:
+            ok, frame = cap.retrieve()
+            if ok and is_sample:
+                height, width = frame.shape[:2]
+                size = (SAMPLE_WIDTH, max(1, round(height * SAMPLE_WIDTH / width)))
+                small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                samples.append(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+            if ok and is_candidate:
+                candidates[0].append(frame)
+                candidates[1].append(cover_selector.thumbnail(frame))
+                candidates[2].append(decoded)
+        decoded += 1
+    if not samples:
+        return np.empty((0, 0, 0), dtype=np.float32), decoded, candidates
+    return np.stack(samples).astype(np.float32) / 255.0, decoded, candidates
+
+
+def inspect_video(video_path: str, aspect_ratio: Optional[str] = None, cover_path: Optional[str] = None) -> dict:
+    """
+    Задача для media_pool: параметры видео и список найденных проблем ("problems").
+    Пустой список — видео можно импортировать. Если передан cover_path и проблем нет,
+    туда пишется JPEG лучшего кадра первых секунд, а сведения о нём — в "cover".
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return {"problems": ["unreadable file"]}
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        declared_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        stride = max(1, round((fps or 25) / SAMPLES_PER_SECOND))
+        # Без cover_path кандидаты не собираются (cover_last_frame = -1)
+        cover_last_frame = int((fps or 25) * COVER_WINDOW_SECONDS) if cover_path else -1
+        samples, decoded, candidates = _sample_frames(
+            cap, stride, cover_selector.candidate_stride(fps or 25), cover_last_frame
+        )
+    finally:
+        cap.release()
+
+    duration = decoded / fps if fps else 0.0
+    report = {"duration": round(duration, 2), "width": width, "height": height, "fps": round(fps, 2), "problems": []}
+    problems = report["problems"]
+
+    if not decoded or not len(samples):
+        problems.append("no decodable frames")
+        return report
+    if declared_frames and decoded < declared_frames * DECODED_FRACTION:
+        problems.append(f"truncated: decoded {decoded} of {declared_frames} frames")
+    if duration < MIN_DURATION:
+        problems.append(f"too short: {duration:.1f}s")
+    if min(width, height) < MIN_SIDE:
+        problems.append(f"low resolution: {width}x{height}")
+    if fps < MIN_FPS:
+        problems.append(f"low fps: {fps:.1f}")
+    expected = _parse_aspect(aspect_ratio)
+    if expected and height and abs(width / height - expected) / expected > ASPECT_TOLERANCE:
+        problems.append(f"aspect {width}x{height} does not match {aspect_ratio}")
+
+    # Чёрные кадры, зависания и отсутствие движения — по всем выборкам сразу
+    brightness = samples.reshape(len(samples), -1).mean(axis=1)
+    black_fraction = float((brightness < BLACK_LEVEL).mean())
+    if black_fraction > MAX_BLACK_FRACTION:
+        problems.append(f"black frames: {black_fraction:.0%}")
+
+    if len(samples) > 1:
+        motion = np.abs(np.diff(samples, axis=0)).reshape(len(samples) - 1, -1).mean(axis=1)
+        # Самая длинная серия подряд неизменных выборок
+        frozen = np.concatenate(([0], (motion < FROZEN_THRESHOLD).astype(np.int8), [0]))
+        edges = np.flatnonzero(np.diff(frozen))
+        longest = int((edges[1::2] - edges[::2]).max()) if len(edges) else 0
+        frozen_seconds = longest * stride / (fps or 25)
+        report["motion"] = round(float(motion.mean()), 4)
+        if frozen_seconds > MAX_FROZEN_SECONDS:
+            problems.append(f"frozen for {frozen_seconds:.1f}s")
+        elif report["motion"] < MIN_MOTION:
+            problems.append(f"almost no motion ({report['motion']:.4f})")
+
+    if cover_path and not problems and candidates[0]:
+        frames, thumbs, frame_numbers = candidates
+        frame, report["cover"] = cover_selector.pick_best(frames, thumbs, [n / (fps or 25) for n in frame_numbers])
+        if not cv2.imwrite(cover_path, frame):
+            raise RuntimeError(f"Could not write cover frame to {cover_path}")
+    return report
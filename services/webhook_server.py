@@ -0,0 +1,116 @@
+import hmac
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from dotenv import load_dotenv
+from services import poller
+from utils.logger import setup_logger
+
+load_dotenv()
+logger = setup_logger("Webhooks")
+
+# Публичный адрес, по которому провайдеры (kie.ai, piapi) могут достучаться до воркера.
+# Если адрес или секрет не заданы, webhook не используются и остаётся обычный опрос.
+WEBHOOK_PUBLIC_URL = os.getenv("WEBHOOK_PUBLIC_URL", "").rstrip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def is_enabled() -> bool:
+    return bool(WEBHOOK_PUBLIC_URL and WEBHOOK_SECRET)
+
+
+def callback_url(provider: str) -> str:
+    """URL для callBackUrl / webhook_config.endpoint или пустая строка, если webhook выключены."""
+    if not is_enabled():
+        return ""
+    return f"{WEBHOOK_PUBLIC_URL}/callback/{provider}?token={WEBHOOK_SECRET}"
+
+
+def webhook_secret() -> str:
+    return WEBHOOK_SECRET if is_enabled() else ""
+
+
+def _extract_task_id(payload: Any) -> Optional[str]:
+    # kie.ai: {"data": {"taskId": ...}}, piapi: {"data": {"task_id": ...}}
+    data = payload.get("data")
+    for container in (data if isinstance(data, dict) else {}, payload):
+        for key in ("taskId", "task_id", "id"):
+            value = container.get(key)
+            if value:
+                return str(value)
+    return None
+
+
+class _CallbackHandler(BaseHTTPRequestHandler):
+    def _reply(self, code: int, message: str) -> None:
+        body = json.dumps({"message": message}).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self, query: dict[str, list[str]]) -> bool:
+        # kie.ai передаёт наш токен в query-строке callBackUrl, piapi — секрет в заголовке
+        provided = query.get("token", [""])[0] or self.headers.get("x-webhook-secret", "")
+        return bool(provided) and hmac.compare_digest(provided, WEBHOOK_SECRET)
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "callback":
+            self._reply(404, "not found")
+            return
+        provider = parts[1]
+
+        if not self._authorized(parse_qs(url.query)):
+            logger.warning(f"🚫 Rejected callback for '{provider}' from {self.client_address[0]}: bad secret")
+            self._reply(403, "forbidden")
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self._reply(400, "bad request")
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._reply(400, "invalid json")
+            return
+
+        task_id = _extract_task_id(payload) if isinstance(payload, dict) else None
+        if not task_id:
+            logger.warning(f"⚠️ Callback for '{provider}' without task id: {payload}")
+            self._reply(400, "missing task id")
+            return
+
+        if poller.notify(provider, task_id):
+            logger.info(f"📬 Callback for {provider} task {task_id}")
+        else:
+            logger.info(f"📭 Callback for unknown {provider} task {task_id}, ignoring")
+        self._reply(200, "ok")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+
+def start_webhook_server() -> Optional[ThreadingHTTPServer]:
+    if not is_enabled():
+        logger.info("Webhooks disabled (WEBHOOK_PUBLIC_URL / WEBHOOK_SECRET not set), using polling only.")
+        return None
+
+    server = ThreadingHTTPServer((WEBHOOK_HOST, WEBHOOK_PORT), _CallbackHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="webhook-server", daemon=True)
+    thread.start()
+    logger.info(f"📡 Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT} ({WEBHOOK_PUBLIC_URL})")
+    return server
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Модули с состоянием (очередь задач, checkpoints, ...) открывают SQLite при импорте,
+# поэтому путь к тестовой базе задаётся до того, как тесты их импортируют.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SEEMEEGO_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="seemeego-tests-"), "test.db"))
+# Клиенты провайдеров проверяют ключи при импорте; запросов к API тесты не делают
+for _key in ("KIEAI_API_KEY", "LUMAAI_API_KEY", "OPENAI_API_KEY", "PIAPI_API_KEY"):
+    os.environ.setdefault(_key, "test")
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from services import choose_generate_video, engine_stats
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_breaker
+from utils.rate_limit import RateLimitExceeded
+
+
+def _opened(name, reset_timeout=0.05, **kwargs):
+    breaker = CircuitBreaker(name, failure_threshold=2, reset_timeout=reset_timeout, **kwargs)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_failure_threshold():
+    breaker = CircuitBreaker("test-threshold", failure_threshold=3, reset_timeout=60)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test-reset-count", failure_threshold=2, reset_timeout=60)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_reset_timeout():
+    breaker = _opened("test-half-open")
+    assert breaker.state == OPEN
+
+    time.sleep(0.08)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.available()
+
+
+def test_half_open_lets_through_single_probe():
+    breaker = _opened("test-probe", probe_timeout=60)
+    time.sleep(0.08)
+
+    assert breaker.allow()
+    # Пока пробная попытка не вернулась, остальные запросы не проходят
+    assert not breaker.allow()
+    assert not breaker.available()
+
+
+def test_lost_probe_is_replaced_after_probe_timeout():
+    breaker = _opened("test-probe-timeout", probe_timeout=0.05)
+    time.sleep(0.08)
+    assert breaker.allow()
+
+    time.sleep(0.08)
+
+    assert breaker.allow()
+
+
+def test_successful_probe_closes_circuit():
+    breaker = _opened("test-probe-success")
+    time.sleep(0.08)
+    assert breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_circuit():
+    breaker = _opened("test-probe-failure")
+    time.sleep(0.08)
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_get_breaker_shares_instance_by_name():
+    assert get_breaker("test-shared") is get_breaker("test-shared")
+    assert get_breaker("test-shared") is not get_breaker("test-other")
+
+
+def test_local_rate_limit_does_not_count_as_engine_failure(monkeypatch):
+    def submit(*args):
+        raise RateLimitExceeded("kieai submit budget exhausted")
+
+    results = []
+    monkeypatch.setattr(engine_stats, "record_result", lambda name, success: results.append(success))
+    breaker = choose_generate_video._provider_breaker("Veo 3 AI")
+    start = choose_generate_video._observed("Veo 3 AI", submit)
+
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(RateLimitExceeded):
+            start("prompt")
+
+    assert breaker.state == CLOSED
+    assert results == []
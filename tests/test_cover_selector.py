@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+from services import cover_selector
+from services.cover_selector import SCORE_WIDTH
+
+
+def _textured(seed, height=90, width=SCORE_WIDTH):
+    """Цветной кадр с мелкими деталями и нормальной экспозицией."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(40, 216, (height, width, 3), dtype=np.uint8)
+
+
+def _black(height=90, width=SCORE_WIDTH):
+    return np.full((height, width, 3), 5, dtype=np.uint8)
+
+
+def test_candidate_stride():
+    assert cover_selector.candidate_stride(24) == 6
+    assert cover_selector.candidate_stride(2) == 1
+
+
+def test_thumbnail_keeps_aspect_ratio():
+    thumb = cover_selector.thumbnail(np.zeros((720, 1280, 3), dtype=np.uint8))
+
+    assert thumb.shape == (90, SCORE_WIDTH, 3)
+
+
+def test_black_frames_are_rejected():
+    scores, metrics = cover_selector.score_candidates(np.stack([_black(), _textured(1)]))
+
+    assert np.isneginf(scores[0])
+    assert np.isfinite(scores[1])
+    assert metrics["black"].tolist() == [True, False]
+
+
+def test_duplicate_of_earlier_candidate_is_rejected():
+    frame = _textured(1)
+    scores, metrics = cover_selector.score_candidates(np.stack([frame, _textured(2), frame.copy()]))
+
+    # Первое появление кадра остаётся кандидатом, повтор — нет
+    assert metrics["duplicate"].tolist() == [False, False, True]
+    assert np.isfinite(scores[0]) and np.isneginf(scores[2])
+
+
+def test_sharp_frame_beats_blurred():
+    sharp = _textured(1)
+    blurred = cv2.GaussianBlur(sharp, (9, 9), 5)
+
+    scores, metrics = cover_selector.score_candidates(np.stack([blurred, sharp]))
+
+    assert metrics["sharpness"][1] > metrics["sharpness"][0]
+    assert scores[1] > scores[0]
+
+
+def test_pick_best_returns_full_frame_and_info():
+    frames = [np.full((720, 1280, 3), value, dtype=np.uint8) for value in (0, 1, 2)]
+    sharp = _textured(1)
+    thumbs = [_black(), cv2.GaussianBlur(sharp, (9, 9), 5), sharp]
+
+    frame, info = cover_selector.pick_best(frames, thumbs, [0.0, 0.25, 0.5])
+
+    assert frame is frames[2]
+    assert info["time"] == 0.5
+    assert info["candidates"] == 3
+    assert info["rejected"] == 1
+
+
+def test_pick_best_falls_back_to_brightest_when_all_rejected():
+    frames = [np.zeros((4, 4, 3), dtype=np.uint8) for _ in range(2)]
+    thumbs = [_black(), np.full((90, SCORE_WIDTH, 3), 10, dtype=np.uint8)]
+
+    frame, info = cover_selector.pick_best(frames, thumbs, [0.0, 0.25])
+
+    assert frame is frames[1]
+    assert info["rejected"] == 2
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import Future
+
+from services import choose_generate_video, latency_stats, poller, provider_tasks
+from services.poller import PENDING, PollResult
+from utils.db import transaction
+
+
+def _pending(task_id):
+    return PollResult(PENDING)
+
+
+def _continue(future, *args):
+    """Продолжение пайплайна для provider_tasks.resumable — в тестах ничего не делает."""
+
+
+def _saved_tasks(provider):
+    with transaction() as conn:
+        return [row["task_id"] for row in conn.execute(
+            "SELECT task_id FROM provider_tasks WHERE provider = ?", (provider,)
+        )]
+
+
+def test_hedge_backup_task_is_persisted(monkeypatch):
+    backups = []
+
+    def start_backup(prompt):
+        future = poller.track("test-hedge", f"backup-{prompt}", _pending, interval=60)
+        backups.append(future)
+        return future
+
+    monkeypatch.setattr(latency_stats, "quantile", lambda key, q: 0.05)
+    monkeypatch.setattr(
+        choose_generate_video, "choose_video_generator",
+        lambda for_image, exclude: ("Backup", start_backup)
+    )
+    choose_generate_video.reset_hedge_budget()
+    primary: Future = Future()
+    start = choose_generate_video.hedged("Primary", lambda prompt: primary, False, on_winner=lambda engine: None)
+
+    with provider_tasks.resumable(_continue, "job"):
+        result = start("p1")
+
+    deadline = time.time() + 5
+    while not backups and time.time() < deadline:
+        time.sleep(0.02)
+    try:
+        # Дубль запущен из потока таймера, но его задача сохранена для возобновления после перезапуска
+        assert _saved_tasks("test-hedge") == ["backup-p1"]
+    finally:
+        result.cancel()
+        for future in backups:
+            future.cancel()
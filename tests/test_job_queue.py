@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from services import job_queue
+from utils import db
+
+
+def _task(*args):
+    """Функция задачи: очередь хранит её по ссылке 'module:qualname'."""
+
+
+def _drain(queue):
+    while (job := job_queue.lease(queue)) is not None:
+        job_queue.ack(job.id)
+
+
+def test_leased_job_is_not_delivered_twice_while_lease_is_valid():
+    job_id = job_queue.put(_task, (1, "a"), queue="q-lease")
+
+    job = job_queue.lease("q-lease")
+
+    assert job.id == job_id
+    assert job.func is _task
+    assert job.args == (1, "a")
+    assert job.deliveries == 1
+    assert job_queue.lease("q-lease") is None
+    job_queue.ack(job.id)
+
+
+def test_expired_lease_redelivers_job(monkeypatch):
+    monkeypatch.setattr(job_queue, "VISIBILITY_TIMEOUT", 0.05)
+    job_id = job_queue.put(_task, (), queue="q-expiry")
+    job_queue.lease("q-expiry")
+
+    time.sleep(0.1)
+    job = job_queue.lease("q-expiry")
+
+    assert job.id == job_id
+    assert job.deliveries == 2
+    job_queue.ack(job.id)
+
+
+def test_job_dropped_after_max_deliveries(monkeypatch):
+    monkeypatch.setattr(job_queue, "VISIBILITY_TIMEOUT", 0)
+    job_queue.put(_task, (), queue="q-poison")
+    for _ in range(job_queue.MAX_DELIVERIES):
+        assert job_queue.lease("q-poison") is not None
+
+    assert job_queue.lease("q-poison") is None
+    assert job_queue.size("q-poison") == 0
+
+
+def test_ack_removes_job():
+    job_queue.put(_task, (), queue="q-ack")
+    job = job_queue.lease("q-ack")
+
+    job_queue.ack(job.id)
+
+    assert job_queue.size("q-ack") == 0
+    assert job_queue.lease("q-ack") is None
+
+
+def test_delayed_put_is_not_available_early():
+    job_queue.put(_task, (), queue="q-delay", delay=0.1)
+
+    assert job_queue.lease("q-delay") is None
+    time.sleep(0.15)
+    assert job_queue.lease("q-delay") is not None
+    _drain("q-delay")
+
+
+def test_job_survives_restart():
+    job_id = job_queue.put(_task, ([1, 2], {"k": "v"}), queue="q-restart")
+    job_queue.lease("q-restart")   # задача была в работе, когда процесс остановился
+
+    # Новый процесс: новое соединение с той же базой, аренды прежних воркеров возвращаются в очередь
+    db._conn.close()
+    db._conn = None
+    assert job_queue.release_all_leases() >= 1
+    job = job_queue.lease("q-restart")
+
+    assert job.id == job_id
+    assert job.args == ([1, 2], {"k": "v"})
+    assert job.deliveries == 2
+    job_queue.ack(job.id)
+
+
+def test_put_rejects_non_importable_function():
+    with pytest.raises(TypeError):
+        job_queue.put(lambda: None, (), queue="q-invalid")
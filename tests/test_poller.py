@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from services import poller, provider_tasks
+from services.poller import COMPLETED, PENDING, PollResult
+from utils.db import transaction
+
+FAST = {"interval": 0.05, "first_delay": 0}
+
+
+def _pending(task_id):
+    return PollResult(PENDING)
+
+
+_cancel_polls = []
+
+
+def _pending_and_count(task_id):
+    _cancel_polls.append(task_id)
+    return PollResult(PENDING)
+
+
+def _continue(future, *args):
+    """Продолжение пайплайна для provider_tasks.resumable — в тестах ничего не делает."""
+
+
+def _saved_tasks(provider):
+    with transaction() as conn:
+        return conn.execute("SELECT task_id FROM provider_tasks WHERE provider = ?", (provider,)).fetchall()
+
+
+def _wait_untracked(key, timeout=5):
+    deadline = time.time() + timeout
+    while key in poller._in_flight and time.time() < deadline:
+        time.sleep(0.02)
+    return key not in poller._in_flight
+
+
+def test_track_resolves_with_completed_result():
+    polls = []
+
+    def check(task_id):
+        polls.append(task_id)
+        return PollResult(COMPLETED, result=f"https://cdn/{task_id}.mp4") if len(polls) >= 2 else PollResult(PENDING)
+
+    future = poller.track("test-complete", "t1", check, **FAST)
+
+    assert future.result(timeout=5) == "https://cdn/t1.mp4"
+    assert polls == ["t1", "t1"]
+
+
+def test_track_times_out_after_max_wait():
+    future = poller.track("test-timeout", "t1", _pending, max_wait=0.2, **FAST)
+
+    with pytest.raises(TimeoutError):
+        future.result(timeout=5)
+    assert _wait_untracked(("test-timeout", "t1"))
+
+
+def test_then_chains_second_tracked_future():
+    def check(task_id):
+        return PollResult(COMPLETED, result=task_id.upper())
+
+    first = poller.track("test-chain", "first", check, **FAST)
+    chained = poller.then(first, lambda result: poller.track("test-chain", f"{result}-second", check, **FAST))
+
+    assert chained.result(timeout=5) == "FIRST-SECOND"
+
+
+def test_then_passes_errors_to_on_error():
+    failed: Future = Future()
+    chained = poller.then(failed, lambda result: "unused", on_error=lambda e: f"handled: {e}")
+
+    failed.set_exception(RuntimeError("boom"))
+
+    assert chained.result(timeout=1) == "handled: boom"
+
+
+def test_cancelled_future_stops_polling_and_is_not_resumed():
+    # check сохраняется в базу по ссылке, поэтому это функция модуля, а не замыкание
+    with provider_tasks.resumable(_continue, "job"):
+        future = poller.track("test-cancel", "t1", _pending_and_count, **FAST)
+    assert len(_saved_tasks("test-cancel")) == 1
+
+    future.cancel()
+    assert _wait_untracked(("test-cancel", "t1"))
+    time.sleep(0.05)
+    polls_after_cancel = len(_cancel_polls)
+    time.sleep(0.2)
+
+    assert len(_cancel_polls) == polls_after_cancel
+    # Задача забыта и не будет снова поставлена на опрос после перезапуска
+    assert _saved_tasks("test-cancel") == []
+
+
+def test_cancelling_chained_future_cancels_source():
+    source = poller.track("test-cancel-chain", "t1", _pending, **FAST)
+    chained = poller.then(source, lambda result: result)
+
+    chained.cancel()
+
+    assert source.cancelled()
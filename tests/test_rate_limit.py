@@ -0,0 +1,84 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from utils import rate_limit
+from utils.rate_limit import POLL, SUBMIT, RateLimitExceeded, TokenBucket
+
+
+def test_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(per_minute=60)   # 1 токен в секунду, запас 10
+    now = bucket.updated_at
+
+    for _ in range(10):
+        assert bucket.wait_time(now) == 0
+        bucket.tokens -= 1
+
+    assert bucket.wait_time(now) == pytest.approx(1.0)
+    assert bucket.wait_time(now + 1.0) == 0
+
+
+def test_acquire_raises_when_budget_exhausted(monkeypatch):
+    monkeypatch.setenv("RATE_TESTEXHAUST_SUBMIT_PER_MINUTE", "6")   # запас в один токен
+    rate_limit.acquire("testexhaust", SUBMIT)
+
+    with pytest.raises(RateLimitExceeded):
+        rate_limit.acquire("testexhaust", SUBMIT)
+
+
+def test_acquire_waits_for_next_token(monkeypatch):
+    monkeypatch.setenv("RATE_TESTWAIT_POLL_PER_MINUTE", "600")   # 10 токенов в секунду
+    for _ in range(100):
+        rate_limit.acquire("testwait", POLL)
+
+    started = time.monotonic()
+    rate_limit.acquire("testwait", POLL, timeout=1)
+
+    assert 0.05 <= time.monotonic() - started < 1
+
+
+def test_credentials_have_separate_budgets(monkeypatch):
+    monkeypatch.setenv("RATE_TESTSEP_A_SUBMIT_PER_MINUTE", "6")
+    monkeypatch.setenv("RATE_TESTSEP_B_SUBMIT_PER_MINUTE", "6")
+    rate_limit.acquire("testsep_a", SUBMIT)
+
+    rate_limit.acquire("testsep_b", SUBMIT)
+    with pytest.raises(RateLimitExceeded):
+        rate_limit.acquire("testsep_a", SUBMIT)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"Retry-After": "12"}, 12),
+    ({"Retry-After": "-5"}, 0),
+    ({"Retry-After": "soon"}, rate_limit.DEFAULT_RETRY_AFTER),
+    ({}, rate_limit.DEFAULT_RETRY_AFTER),
+    (None, rate_limit.DEFAULT_RETRY_AFTER),
+])
+def test_retry_after_seconds(headers, expected):
+    assert rate_limit.retry_after_seconds(headers) == expected
+
+
+def test_retry_after_http_date():
+    headers = {"Retry-After": formatdate(time.time() + 60, usegmt=True)}
+
+    assert 55 <= rate_limit.retry_after_seconds(headers) <= 60
+
+
+def test_throttle_blocks_all_kinds_of_requests():
+    rate_limit.acquire("testthrottle", SUBMIT)
+
+    rate_limit.throttle("testthrottle", 60)
+
+    for kind in (SUBMIT, POLL):
+        with pytest.raises(RateLimitExceeded):
+            rate_limit.acquire("testthrottle", kind, timeout=1)
+
+
+def test_throttle_expires():
+    rate_limit.throttle("testthrottle_short", 0.1)
+
+    started = time.monotonic()
+    rate_limit.acquire("testthrottle_short", POLL, timeout=1)
+
+    assert time.monotonic() - started >= 0.09
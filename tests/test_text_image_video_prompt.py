@@ -0,0 +1,68 @@
+import base64
+
+import cv2
+import numpy as np
+import pytest
+
+from prompt import text_image_video_prompt
+from prompt.text_image_video_prompt import THUMBNAIL_MAX_SIDE, _image_input
+
+
+class _Response:
+    def __init__(self, content=b"", status=200):
+        self.content = content
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+
+def _jpeg(width, height):
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def _decode_data_url(url):
+    prefix = "data:image/jpeg;base64,"
+    assert url.startswith(prefix)
+    data = np.frombuffer(base64.b64decode(url[len(prefix):]), dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    def install(response):
+        monkeypatch.setattr(text_image_video_prompt.http, "get", lambda url, **kwargs: response)
+    monkeypatch.setattr(text_image_video_prompt, "SCENE_THUMBNAIL", True)
+    return install
+
+
+def test_large_image_is_downscaled_to_thumbnail(serve):
+    serve(_Response(_jpeg(2048, 1024)))
+
+    block = _image_input("https://cdn/scene.jpg")
+
+    assert block["detail"] == "low"
+    assert _decode_data_url(block["url"]).shape[:2] == (THUMBNAIL_MAX_SIDE // 2, THUMBNAIL_MAX_SIDE)
+
+
+def test_small_image_keeps_its_size(serve):
+    serve(_Response(_jpeg(300, 200)))
+
+    block = _image_input("https://cdn/scene.jpg")
+
+    assert _decode_data_url(block["url"]).shape[:2] == (200, 300)
+
+
+@pytest.mark.parametrize("response", [_Response(status=404), _Response(b"not an image")])
+def test_falls_back_to_original_url(serve, response):
+    serve(response)
+
+    assert _image_input("https://cdn/scene.jpg") == {"url": "https://cdn/scene.jpg"}
+
+
+def test_thumbnail_disabled_sends_original_url(monkeypatch):
+    monkeypatch.setattr(text_image_video_prompt, "SCENE_THUMBNAIL", False)
+
+    assert _image_input("https://cdn/scene.jpg") == {"url": "https://cdn/scene.jpg"}
@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+import pytest
+
+from services import video_qc
+from services.video_qc import inspect_video
+
+FPS = 15
+
+
+def _write_video(path, frames, fps=FPS):
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    assert writer.isOpened()
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def _moving(seconds, width=640, height=480, fps=FPS):
+    """Крупная цветная текстура, которая сдвигается каждый кадр."""
+    rng = np.random.default_rng(0)
+    texture = cv2.resize(rng.integers(40, 216, (height // 8, width // 4, 3), dtype=np.uint8),
+                         (width * 2, height), interpolation=cv2.INTER_NEAREST)
+    return [texture[:, i * 8:i * 8 + width].copy() for i in range(int(seconds * fps))]
+
+
+def _problems(report, prefix):
+    return [problem for problem in report["problems"] if problem.startswith(prefix)]
+
+
+def test_good_video_has_no_problems(tmp_path):
+    path = _write_video(tmp_path / "good.mp4", _moving(4))
+
+    report = inspect_video(path, aspect_ratio="4:3")
+
+    assert report["problems"] == []
+    assert (report["width"], report["height"], report["fps"]) == (640, 480, FPS)
+    assert report["duration"] == pytest.approx(4, abs=0.1)
+    assert report["motion"] > video_qc.MIN_MOTION
+    assert "cover" not in report
+
+
+def test_unreadable_file(tmp_path):
+    path = tmp_path / "broken.mp4"
+    path.write_bytes(b"not a video")
+
+    assert inspect_video(str(path))["problems"] in (["unreadable file"], ["no decodable frames"])
+
+
+def test_black_video(tmp_path):
+    frames = [np.zeros((480, 640, 3), dtype=np.uint8)] * (4 * FPS)
+    report = inspect_video(_write_video(tmp_path / "black.mp4", frames))
+
+    assert _problems(report, "black frames")
+
+
+def test_frozen_video(tmp_path):
+    frame = _moving(1)[0]
+    frames = _moving(1) + [frame] * (3 * FPS)
+    report = inspect_video(_write_video(tmp_path / "frozen.mp4", frames))
+
+    assert _problems(report, "frozen for")
+    assert not _problems(report, "black frames")
+
+
+def test_short_video(tmp_path):
+    report = inspect_video(_write_video(tmp_path / "short.mp4", _moving(1)))
+
+    assert _problems(report, "too short")
+
+
+def test_low_resolution(tmp_path):
+    report = inspect_video(_write_video(tmp_path / "small.mp4", _moving(4, width=320, height=240)))
+
+    assert _problems(report, "low resolution")
+
+
+def test_wrong_aspect_ratio(tmp_path):
+    path = _write_video(tmp_path / "wide.mp4", _moving(4))
+
+    assert _problems(inspect_video(path, aspect_ratio="9:16"), "aspect 640x480 does not match 9:16")
+    assert inspect_video(path, aspect_ratio="not-a-ratio")["problems"] == []
+
+
+def test_cover_written_for_good_video(tmp_path):
+    frames = [np.zeros((480, 640, 3), dtype=np.uint8)] * 3 + _moving(4)
+    cover_path = str(tmp_path / "cover.jpg")
+
+    report = inspect_video(_write_video(tmp_path / "good.mp4", frames), cover_path=cover_path)
+
+    assert report["problems"] == []
+    cover = cv2.imread(cover_path)
+    assert cover.shape == (480, 640, 3)
+    # Чёрные кадры в начале не становятся обложкой
+    assert report["cover"]["time"] > 0
+    assert report["cover"]["candidates"] > 1
+
+
+def test_cover_not_written_for_rejected_video(tmp_path):
+    cover_path = tmp_path / "cover.jpg"
+
+    report = inspect_video(_write_video(tmp_path / "short.mp4", _moving(1)), cover_path=str(cover_path))
+
+    assert report["problems"]
+    assert "cover" not in report
+    assert not cover_path.exists()
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("CircuitBreaker")
+
+# Состояния автомата: closed — запросы идут, open — сразу отказ,
+# half-open — после паузы пропускается одна пробная попытка.
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 60))
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: цепь для провайдера/хоста разомкнута."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        probe_timeout: Optional[float] = None
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # Если исход пробной попытки так и не пришёл, через столько секунд пускаем следующую
+        self.probe_timeout = probe_timeout if probe_timeout is not None else reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._state = CLOSED
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.time() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe_started = None
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _probe_free(self) -> bool:
+        return self._probe_started is None or time.time() - self._probe_started >= self.probe_timeout
+
+    def available(self) -> bool:
+        """Можно ли сейчас отправить запрос (не занимая пробную попытку)."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._probe_free())
+
+    def allow(self) -> bool:
+        """Как available(), но в half-open занимает единственную пробную попытку."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probe_free():
+                self._probe_started = time.time()
+                logger.info(f"🔎 Circuit '{self.name}' half-open, sending probe")
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"✅ Circuit '{self.name}' closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != OPEN:
+                    logger.warning(
+                        f"⛔ Circuit '{self.name}' opened after {self._failures} failure(s), "
+                        f"retry in {self.reset_timeout:.0f}s"
+                    )
+                self._state = OPEN
+                self._opened_at = time.time()
+                self._probe_started = None
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Общий автомат по имени ("host:api.kie.ai", "provider:veo3", ...)."""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **kwargs)
+            _breakers[name] = breaker
+        return breaker
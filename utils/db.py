@@ -0,0 +1,41 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Локальная база для состояния воркера (очередь задач и т.п.).
+# Каталог должен лежать на томе, который переживает перезапуск контейнера.
+DB_PATH = os.getenv("SEEMEEGO_DB_PATH", os.path.join("data", "seemeego.db"))
+
+_lock = threading.RLock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def get_connection() -> sqlite3.Connection:
+    global _conn
+    with _lock:
+        if _conn is None:
+            directory = os.path.dirname(DB_PATH)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            _conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+            _conn.row_factory = sqlite3.Row
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+        return _conn
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Единственное соединение на процесс, доступ сериализуется блокировкой."""
+    with _lock:
+        conn = get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
@@ -0,0 +1,100 @@
+import threading
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import rate_limit
+from utils.circuit_breaker import CircuitOpenError, get_breaker
+
+# Общий HTTP-транспорт для всех клиентов: одна Session с пулом keep-alive
+# соединений на каждый хост (api.kie.ai, api.piapi.ai, api.lumalabs.ai, seemeego.ai, ...),
+# чтобы не платить за TCP+TLS рукопожатие на каждый запрос.
+
+DEFAULT_TIMEOUT = (10, 60)   # (connect, read) секунд, если вызывающий не указал свой
+POOL_MAXSIZE = 32            # соединений на хост — с запасом на все пулы воркеров и опрос статусов
+SUBMIT_429_RETRIES = 2       # сколько раз повторить отправку задачи после 429 (провайдер её не принял)
+
+_sessions: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    # Повторяем только обрывы соединения и только для идемпотентных запросов
+    retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.5, allowed_methods={"GET", "HEAD"})
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    host = urlsplit(url).netloc
+    session = _sessions.get(host)
+    if session is None:
+        with _lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _new_session()
+                _sessions[host] = session
+    return session
+
+
+def host_breaker(url: str):
+    return get_breaker(f"host:{urlsplit(url).netloc}")
+
+
+def _send(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """
+    Запрос через пул хоста. Пока хост не отвечает (обрывы, таймауты, 5xx),
+    цепь хоста разомкнута и запросы сразу падают с CircuitOpenError,
+    не занимая воркер на полный таймаут.
+    """
+    breaker = host_breaker(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit for {urlsplit(url).netloc} is open")
+
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+    except (requests.ConnectionError, requests.Timeout):
+        breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def request(method: str, url: str, quota: Optional[tuple[str, str]] = None, **kwargs: Any) -> requests.Response:
+    """
+    quota=(ключ, rate_limit.SUBMIT | rate_limit.POLL) — запрос расходует бюджет этого API-ключа.
+    Отправка задачи сверх бюджета ждёт своей очереди, опрос статуса — нет (бросает
+    RateLimitExceeded, и poller просто повторит его позже). На 429 все запросы по ключу
+    приостанавливаются на Retry-After, а отправка задачи повторяется после паузы.
+    """
+    if quota is None:
+        return _send(method, url, **kwargs)
+
+    credential, kind = quota
+    wait_timeout = rate_limit.SUBMIT_WAIT_TIMEOUT if kind == rate_limit.SUBMIT else None
+    attempts = 1 + (SUBMIT_429_RETRIES if kind == rate_limit.SUBMIT else 0)
+    for attempt in range(attempts):
+        rate_limit.acquire(credential, kind, timeout=wait_timeout)
+        response = _send(method, url, **kwargs)
+        if response.status_code != 429:
+            break
+        rate_limit.throttle(credential, rate_limit.retry_after_seconds(response.headers))
+    return response
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import openai
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from utils import llm_cache
+from utils.logger import setup_logger
+
+load_dotenv()
+logger = setup_logger("LLM")
+
+# Единый шлюз к OpenAI для всех модулей: один клиент с пулом соединений,
+# ограничение одновременных запросов, таймауты, повторы с джиттером и метрики по местам вызова.
+DEFAULT_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 3))
+RETRY_BASE_DELAY = 1.0
+
+# Повторяем только временные сбои; ошибки запроса (400, 401, ...) повторять бессмысленно
+_RETRYABLE = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hits: int = 0
+
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_stats_lock = threading.Lock()
+_stats: dict[str, CallStats] = {}
+
+
+def get_client() -> OpenAI:
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("Missing OPENAI_API_KEY environment variable")
+            # Повторы делаем сами (с джиттером и учётом в метриках)
+            _client = OpenAI(api_key=api_key, timeout=LLM_TIMEOUT, max_retries=0)
+        return _client
+
+
+def _record(call_site: str, seconds: float, usage: Any = None, error: bool = False) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(call_site, CallStats())
+        stats.calls += 1
+        stats.seconds += seconds
+        if error:
+            stats.errors += 1
+        if usage is not None:
+            stats.prompt_tokens += usage.prompt_tokens or 0
+            stats.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+
+def _record_cache_hit(call_site: str) -> None:
+    with _stats_lock:
+        _stats.setdefault(call_site, CallStats()).cache_hits += 1
+
+
+def _call(call_site: str, request: Callable[[], Any]) -> Any:
+    """Выполняет запрос с ограничением параллелизма и повторами, записывает метрики."""
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        started_at = time.time()
+        try:
+            with _semaphore:
+                response = request()
+        except _RETRYABLE as e:
+            _record(call_site, time.time() - started_at, error=True)
+            if attempt == LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+            logger.warning(f"⚠️ [{call_site}] {type(e).__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        except Exception:
+            _record(call_site, time.time() - started_at, error=True)
+            raise
+
+        elapsed = time.time() - started_at
+        usage = getattr(response, "usage", None)
+        _record(call_site, elapsed, usage)
+        logger.info(
+            f"🤖 [{call_site}] {elapsed:.1f}s, tokens "
+            f"{usage.prompt_tokens if usage else '?'}+{getattr(usage, 'completion_tokens', 0) if usage else '?'}"
+        )
+        return response
+
+
+def complete(
+    call_site: str,
+    messages: list[dict],
+    model: str = DEFAULT_MODEL,
+    timeout: Optional[float] = None,
+    cache_ttl: Optional[float] = None,
+    **kwargs: Any
+) -> str:
+    """
+    Один chat completion через общий клиент. Возвращает текст ответа.
+    `call_site` — имя места вызова для метрик ("prompt.portrait", "luma.audio_prompt", ...).
+    `cache_ttl` (сек) включает кэш ответов (см. llm_cache) — только для детерминированных
+    помощников, где одинаковый запрос должен давать одинаковый ответ.
+    """
+    cache_key = None
+    if cache_ttl:
+        cache_key = llm_cache.make_key(model, messages, kwargs)
+        cached = llm_cache.get(call_site, cache_key, cache_ttl)
+        if cached is not None:
+            _record_cache_hit(call_site)
+            return cached
+
+    client = get_client()
+    response = _call(call_site, lambda: client.chat.completions.create(
+        model=model,
+        messages=messages,
+        timeout=timeout or LLM_TIMEOUT,
+        **kwargs
+    ))
+    content = response.choices[0].message.content
+    if not isinstance(content, str):
+        raise ValueError(f"Invalid response from OpenAI: {response}")
+    if cache_key:
+        llm_cache.put(call_site, cache_key, content, cache_ttl)
+    return content
+
+
+def embed(call_site: str, texts: list[str], model: str = EMBEDDING_MODEL) -> list[list[float]]:
+    """Эмбеддинги для списка текстов одним запросом, в том же порядке."""
+    client = get_client()
+    response = _call(call_site, lambda: client.embeddings.create(model=model, input=texts, timeout=LLM_TIMEOUT))
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def acomplete(call_site: str, messages: list[dict], **kwargs: Any) -> str:
+    """complete() для async-кода: тот же клиент, лимит одновременных запросов и метрики."""
+    return await asyncio.to_thread(complete, call_site, messages, **kwargs)
+
+
+def metrics() -> dict[str, CallStats]:
+    with _stats_lock:
+        return {site: CallStats(**vars(stats)) for site, stats in _stats.items()}
+
+
+def log_metrics() -> None:
+    for site, stats in sorted(metrics().items()):
+        avg = stats.seconds / stats.calls if stats.calls else 0.0
+        logger.info(
+            f"📊 [{site}] calls={stats.calls} errors={stats.errors} avg={avg:.1f}s "
+            f"tokens={stats.prompt_tokens}+{stats.completion_tokens} cache_hits={stats.cache_hits}"
+        )
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from cachetools import TTLCache
+
+from utils.db import transaction
+
+# Кэш ответов LLM для детерминированных помощников (clean_topic, generate_audio_prompt, ...).
+# Ключ — хэш модели, сообщений и параметров запроса. Первый уровень — LRU в памяти с TTL,
+# второй (по желанию, LLM_CACHE_DISK=1) — таблица в SQLite, чтобы ответы переживали перезапуск.
+MEMORY_MAX_SIZE = int(os.getenv("LLM_CACHE_SIZE", 512))
+DISK_ENABLED = os.getenv("LLM_CACHE_DISK", "0") == "1"
+# Сверх этого числа строк удаляются давно не использованные (по last_used)
+DISK_MAX_ROWS = int(os.getenv("LLM_CACHE_DISK_MAX_ROWS", 5000))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    call_site TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_memory: dict[str, TTLCache] = {}
+_disk_ready = False
+
+
+def make_key(model: str, messages: list[dict], params: dict[str, Any]) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _memory_cache(call_site: str, ttl: float) -> TTLCache:
+    # У каждого места вызова свой TTL, поэтому и свой TTLCache
+    cache = _memory.get(call_site)
+    if cache is None:
+        cache = TTLCache(maxsize=MEMORY_MAX_SIZE, ttl=ttl)
+        _memory[call_site] = cache
+    return cache
+
+
+def _ensure_disk() -> None:
+    global _disk_ready
+    if not _disk_ready:
+        with transaction() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires ON llm_cache (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        _disk_ready = True
+
+
+def get(call_site: str, key: str, ttl: float) -> Optional[str]:
+    with _lock:
+        value = _memory_cache(call_site, ttl).get(key)
+    if value is not None or not DISK_ENABLED:
+        return value
+
+    _ensure_disk()
+    now = time.time()
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+    with _lock:
+        _memory_cache(call_site, ttl)[key] = row["value"]
+    return row["value"]
+
+
+def put(call_site: str, key: str, value: str, ttl: float) -> None:
+    with _lock:
+        _memory_cache(call_site, ttl)[key] = value
+    if not DISK_ENABLED:
+        return
+
+    _ensure_disk()
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, call_site, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, call_site, value, now + ttl, now)
+        )
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            """
+            DELETE FROM llm_cache WHERE key NOT IN (
+                SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT ?
+            )
+            """,
+            (DISK_MAX_ROWS,)
+        )
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("RateLimit")
+
+# Бюджеты запросов на один API-ключ (запросов в минуту). Veo, Runway и Midjourney
+# делят KIEAI_API_KEY, Kling и Hailuo — PIAPI_API_KEY, поэтому лимит считается
+# по ключу, а не по движку. Переопределяются через RATE_<KEY>_<KIND>_PER_MINUTE.
+SUBMIT = "submit"
+POLL = "poll"
+
+DEFAULT_BUDGETS = {
+    ("kieai", SUBMIT): 20,
+    ("kieai", POLL): 120,
+    ("piapi", SUBMIT): 10,
+    ("piapi", POLL): 60,
+    ("luma", SUBMIT): 10,
+    ("luma", POLL): 60,
+}
+FALLBACK_PER_MINUTE = 60
+
+# Сколько отправка задачи может ждать свободного токена, прежде чем сдаться
+SUBMIT_WAIT_TIMEOUT = float(os.getenv("RATE_SUBMIT_WAIT_TIMEOUT", 300))
+# Пауза после 429 без заголовка Retry-After
+DEFAULT_RETRY_AFTER = 30
+
+
+class RateLimitExceeded(Exception):
+    """Бюджет запросов ключа исчерпан."""
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        # Запас на короткий всплеск — примерно 10 секунд бюджета
+        self.capacity = max(1.0, per_minute / 6.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """0, если токен можно взять сейчас, иначе сколько секунд подождать."""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+_lock = threading.Condition()
+_buckets: dict[tuple[str, str], TokenBucket] = {}
+
+
+def _bucket(credential: str, kind: str) -> TokenBucket:
+    key = (credential, kind)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        env_name = f"RATE_{credential.upper()}_{kind.upper()}_PER_MINUTE"
+        per_minute = float(os.getenv(env_name, DEFAULT_BUDGETS.get(key, FALLBACK_PER_MINUTE)))
+        bucket = TokenBucket(per_minute)
+        _buckets[key] = bucket
+    return bucket
+
+
+def acquire(credential: str, kind: str, timeout: Optional[float] = None) -> None:
+    """
+    Берёт токен из бюджета ключа. Если бюджет исчерпан, ждёт своей очереди
+    не дольше timeout (None — не ждать вовсе) и бросает RateLimitExceeded.
+    """
+    deadline = time.monotonic() + (timeout or 0)
+    with _lock:
+        while True:
+            bucket = _bucket(credential, kind)
+            now = time.monotonic()
+            wait = bucket.wait_time(now)
+            if wait <= 0:
+                bucket.tokens -= 1
+                return
+            if now + wait > deadline:
+                raise RateLimitExceeded(f"{credential} {kind} budget exhausted, next slot in {wait:.0f}s")
+            _lock.wait(wait)
+
+
+def retry_after_seconds(headers) -> float:
+    """Разбирает Retry-After (секунды или HTTP-дата)."""
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+def throttle(credential: str, seconds: float) -> None:
+    """Провайдер ответил 429: приостанавливаем все запросы по этому ключу."""
+    until = time.monotonic() + seconds
+    with _lock:
+        for kind in (SUBMIT, POLL):
+            bucket = _bucket(credential, kind)
+            bucket.blocked_until = max(bucket.blocked_until, until)
+        _lock.notify_all()
+    logger.warning(f"🐢 {credential}: provider throttled us, pausing requests for {seconds:.0f}s")